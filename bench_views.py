@@ -0,0 +1,65 @@
+"""Micro-benchmark for rendering the Block Kit views.
+
+Run with `python3 bench_views.py`. Placeholder credentials are used for any
+that aren't set, and nothing is sent to Slack or Airtable.
+"""
+import os
+import timeit
+
+for var in [
+    "SLACK_BOT_TOKEN",
+    "SLACK_USER_TOKEN",
+    "SLACK_SIGNING_SECRET",
+    "SLACK_SUPPORT_CHANNEL",
+    "SLACK_REQUEST_CHANNEL",
+    "SLACK_GH_TICKET_CREATOR",
+    "GITHUB_REPO",
+    "GITHUB_TOKEN",
+    "AIRTABLE_API_KEY",
+    "AIRTABLE_BASE_ID",
+]:
+    os.environ.setdefault(var, "bench")
+
+from utils.airtable import Macro
+from views import create_bug, create_macro, ticket, use_macro
+
+MACROS = [
+    Macro(
+        f"Macro {i}",
+        {
+            "type": "rich_text",
+            "elements": [
+                {
+                    "type": "rich_text_section",
+                    "elements": [{"type": "text", "text": f"Answer number {i} " * 10}],
+                }
+            ],
+        },
+        i % 2 == 0,
+    )
+    for i in range(100)
+]
+
+
+def cold_macro_modal():
+    use_macro.page_cache.clear()
+    use_macro.render_modal("1700000000.000100", "U000", MACROS, 2)
+
+
+def warm_macro_modal():
+    use_macro.render_modal("1700000000.000100", "U000", MACROS, 2)
+
+
+BENCHMARKS = {
+    "create_bug.get_modal": lambda: create_bug.get_modal("1700000000.000100"),
+    "create_macro.get_modal": create_macro.get_modal,
+    "ticket.get_blocks": lambda: ticket.get_blocks("U000", 3, "https://example.com"),
+    "use_macro.render_modal (cold)": cold_macro_modal,
+    "use_macro.render_modal (memoized)": warm_macro_modal,
+}
+
+
+if __name__ == "__main__":
+    for name, func in BENCHMARKS.items():
+        runs, total = timeit.Timer(func).autorange()
+        print(f"{name:<36} {total / runs * 1e6:8.2f} µs")
@@ -0,0 +1,140 @@
+import asyncio
+import dataclasses
+import re
+import time
+from typing import Any, Dict, List
+
+from pyairtable.api.types import RecordDict
+from slack_bolt.async_app import AsyncRespond
+from slack_sdk.web.async_client import AsyncWebClient
+
+from events.direct_to_faq import direct_to_faq
+from events.mark_resolved import handle_mark_resolved
+from utils.env import env
+
+# Threads resolved at once. Airtable writes are batched and Slack calls
+# retry on rate limits, so this only bounds how much runs in parallel.
+BULK_CONCURRENCY = 5
+
+USAGE = """Usage: `/hs-bulk <preview|resolve|faq> [older:<n>m|h|d] [@user] [keywords]`
+• `preview` lists the open threads that match, `resolve` marks them resolved and `faq` points them to the FAQ first
+• `older:2h` only matches threads older than 2 hours
+• `@user` only matches threads from that user
+• anything else is matched against the question text
+At least one filter is required."""
+
+UNITS = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+@dataclasses.dataclass
+class BulkCommand:
+    action: str
+    older_than: float | None = None
+    user_id: str | None = None
+    keyword: str | None = None
+
+
+def parse_command(text: str) -> BulkCommand:
+    """Parses the slash command text, raising ValueError on bad input"""
+    [action, *args] = text.split() or [""]
+    if action not in ("preview", "resolve", "faq"):
+        raise ValueError(f"Unknown action `{action}`")
+
+    command = BulkCommand(action)
+    keywords = []
+    for arg in args:
+        if match := re.fullmatch(r"older:(\d+)([mhd])", arg):
+            command.older_than = int(match[1]) * UNITS[match[2]]
+        elif match := re.fullmatch(r"<@(\w+)(\|[^>]*)?>", arg):
+            command.user_id = match[1]
+        else:
+            keywords.append(arg)
+    command.keyword = " ".join(keywords) or None
+
+    if command.older_than is None and command.user_id is None and command.keyword is None:
+        raise ValueError("At least one filter is required")
+    return command
+
+
+async def select_threads(command: BulkCommand) -> List[RecordDict]:
+    if env.airtable.threads.warmed:
+        records = env.airtable.threads.records()
+    else:
+        # The index only holds threads seen since boot until it has been warmed
+        records = await env.airtable.find_open_requests()
+    records = [
+        x for x in records
+        if x["fields"].get("identifier") and x["fields"].get("internal_thread")
+    ]
+
+    if command.older_than is not None:
+        cutoff = time.time() - command.older_than
+        records = [x for x in records if float(x["fields"]["identifier"]) <= cutoff]
+
+    if command.user_id:
+        person = await env.airtable.get_person(command.user_id)
+        person_id = person["id"] if person else None
+        records = [x for x in records if person_id in x["fields"].get("person", [])]
+
+    if command.keyword:
+        matching = {x["id"] for x in await env.airtable.find_open_requests(command.keyword)}
+        records = [x for x in records if x["id"] in matching]
+
+    return sorted(records, key=lambda x: float(x["fields"]["identifier"]))
+
+
+async def handle_bulk_resolve(body: Dict[str, Any], client: AsyncWebClient, respond: AsyncRespond):
+    try:
+        command = parse_command(body["text"])
+    except ValueError as e:
+        return await respond(f"{e}\n{USAGE}")
+
+    try:
+        records = await select_threads(command)
+    except Exception as e:
+        return await respond(f"Couldn't look up open threads: {e}")
+    if not records:
+        return await respond("No open threads match that.")
+
+    if command.action == "preview":
+        links = "\n".join(
+            f"• <https://hackclub.slack.com/archives/{env.slack_support_channel}/p{x['fields']['identifier'].replace('.', '')}|{x['fields']['identifier']}>"
+            for x in records[:50]
+        )
+        more = f"\n…and {len(records) - 50} more" if len(records) > 50 else ""
+        return await respond(f"{len(records)} open threads match:\n{links}{more}")
+
+    resolver_id = body["user_id"]
+    await respond(f"Resolving {len(records)} threads…")
+
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+    async def resolve(record: RecordDict):
+        async with semaphore:
+            ts = record["fields"]["internal_thread"]
+            if command.action == "faq":
+                return await direct_to_faq(ts, resolver_id, client)
+            return await handle_mark_resolved(ts, resolver_id, client)
+
+    # The response URL can only be used 5 times, so report progress at quarters
+    milestones = {len(records) * n // 4 for n in (1, 2, 3)} if len(records) >= 20 else set()
+    done = failed = skipped = 0
+    for result in asyncio.as_completed([resolve(x) for x in records]):
+        try:
+            if not await result:
+                # Already resolved, or the request could not be found
+                skipped += 1
+        except Exception as e:
+            failed += 1
+            print(f"Bulk resolve failed for a thread: {e}")
+        done += 1
+        if done in milestones:
+            await respond(f"Resolving {len(records)} threads… {done} done", replace_original=True)
+
+    await respond(
+        f"Resolved {done - failed - skipped}/{len(records)} threads"
+        + (f", {skipped} skipped" if skipped else "")
+        + (f", {failed} failed" if failed else "")
+        + ".",
+        replace_original=True,
+    )
@@ -7,13 +7,17 @@ from events.mark_resolved import handle_mark_resolved
 
 
 async def handle_direct_to_faq(body: Dict[str, Any], client: AsyncWebClient):
-    req = env.airtable.get_request(priv_thread_ts=body["message"]["ts"])
+    await direct_to_faq(body["message"]["ts"], body["user"]["id"], client)
+
+
+async def direct_to_faq(ts: str, resolver_id: str, client: AsyncWebClient) -> Dict[str, Any] | None:
+    req = await env.airtable.get_request(priv_thread_ts=ts)
     if not req:
         await client.chat_postMessage(
             channel=env.slack_ticket_creator,
-            text=f"Something went wrong with fetching `{body['message']['ts']}` from Airtable.",
+            text=f"Something went wrong with fetching `{ts}` from Airtable.",
         )
-        return
+        return None
     await client.chat_postMessage(
         channel=env.slack_support_channel,
         thread_ts=req["fields"]["identifier"],
@@ -22,4 +26,4 @@ async def handle_direct_to_faq(body: Dict[str, Any], client: AsyncWebClient):
         unfurl_media=True
     )
 
-    await handle_mark_resolved(ts=body["message"]["ts"], resolver_id=body["user"]["id"], client=client, message=False)
+    return await handle_mark_resolved(ts=ts, resolver_id=resolver_id, client=client, message=False)
@@ -1,19 +1,17 @@
-import asyncio
 from slack_sdk.web.async_client import AsyncWebClient
 from typing import Any, Dict
 
 from utils.airtable import Macro
 from utils.env import env
+from utils.users import get_user
 from events.mark_resolved import handle_mark_resolved
 
 
 async def handle_execute_macro(
     user_id: str, macro: Macro, ts: str, client: AsyncWebClient
 ):
-    user_info_fut = asyncio.create_task(client.users_info(user=user_id))
-
-    user = await user_info_fut
-    user_name = user["user"]["profile"]["display_name"] or user["user"]["real_name"]
+    user = await get_user(client, user_id)
+    user_name = user["profile"]["display_name"] or user["real_name"]
 
     await client.chat_postMessage(
         channel=env.slack_request_channel,
@@ -32,7 +30,7 @@ async def handle_execute_macro(
         unfurl_media=True
     )
     
-    req = env.airtable.get_request(priv_thread_ts=ts)
+    req = await env.airtable.get_request(priv_thread_ts=ts)
     if not req:
         await client.chat_postMessage(
             channel=env.slack_ticket_creator,
@@ -45,7 +43,7 @@ async def handle_execute_macro(
         thread_ts=req["fields"]["identifier"],
         blocks=[macro.message],
         username=user_name,
-        icon_url=user["user"]["profile"]["image_48"],
+        icon_url=user["profile"]["image_48"],
         unfurl_links=True,
         unfurl_media=True
     )
@@ -59,4 +57,4 @@ async def handle_execute_macro(
 
 
 async def create_macro(user_id: str, name: str, message: Dict[str, Any], close: bool):
-    env.airtable.insert_macro(user_id, Macro(name, message, close))
+    await env.airtable.insert_macro(user_id, Macro(name, message, close))
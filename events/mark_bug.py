@@ -2,17 +2,16 @@ from slack_sdk.web.async_client import AsyncWebClient
 from typing import Any, Dict
 
 from utils.env import env
+from utils.github import GitHubError, github
 from events.mark_resolved import handle_mark_resolved
 
-import aiohttp
-
 async def handle_mark_bug(body: Dict[str, Any], client: AsyncWebClient):
     view = body["view"]
     ts = view["blocks"][-1]["block_id"]
     blocks = view["blocks"]
 
 
-    req = env.airtable.update_request(
+    req = await env.airtable.update_request(
         priv_thread_ts=ts,
         updates={
             "status": "responded",
@@ -35,28 +34,30 @@ async def handle_mark_bug(body: Dict[str, Any], client: AsyncWebClient):
 
     footer = f"\n\n---\n\n_This issue was created automatically by the support team. See the appropriate thread [here](https://hackclub.slack.com/archives/{env.slack_support_channel}/p{pub_thread_ts})_"
 
-    data = {
-        'title': issue_title,
-        'body': issue_body + footer,
-        'labels': [label['value'] for label in issue_labels],
-    }
-
-    url = f'https://api.github.com/repos/{env.github_repo}/issues'
-
-    headers = {
-        'Accept': 'application/vnd.github+json',
-        'Authorization': f'Bearer {env.github_token}',
-        'X-GitHub-API-Version': '2022-11-28',
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=data) as resp:
-            if resp.status != 201:
-                await client.chat_postMessage(
-                    channel=env.slack_ticket_creator,
-                    text=f"Error creating issue for `{ts}`: {resp.status}\n```{await resp.text()}```",
-                )
+    try:
+        issue = await github.find_open_issue(issue_title)
+    except GitHubError as e:
+        # The search API has a much lower rate limit, don't let it block reports
+        print(f"Failed to search for duplicate issues: {e}")
+        issue = None
 
+    labels = [label['value'] for label in issue_labels]
+    try:
+        if issue:
+            # Same bug as an open issue, so the report is added to it instead
+            await github.comment_on_issue(issue, issue_body + footer, labels)
+            await client.chat_postMessage(
+                channel=env.slack_ticket_creator,
+                text=f"`{ts}` was reported as a bug that already has an open issue, the report was added to it: {issue['html_url']}",
+            )
+        else:
+            await github.create_issue(issue_title, issue_body + footer, labels)
+    except GitHubError as e:
+        await client.chat_postMessage(
+            channel=env.slack_ticket_creator,
+            text=f"Error {'updating' if issue else 'creating'} issue for `{ts}`: {e.status}\n```{e.message}```",
+        )
+        return
 
     await handle_mark_resolved(
         ts=ts,
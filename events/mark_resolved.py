@@ -1,4 +1,5 @@
 import asyncio
+from typing import AsyncIterator, Dict, Any
 from slack_sdk.errors import SlackApiError
 from slack_sdk.web.async_client import AsyncWebClient
 
@@ -6,24 +7,40 @@ from utils.env import env
 from utils.queue import add_message_to_delete_queue
 
 
+async def iter_replies(
+    client: AsyncWebClient, channel: str, ts: str, limit: int = 1000
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yields every message in a thread, following `next_cursor` page by page"""
+    cursor = None
+    while True:
+        page = await client.conversations_replies(
+            channel=channel, ts=ts, limit=limit, cursor=cursor
+        )
+        for message in page["messages"]:
+            yield message
+
+        cursor = page.get("response_metadata", {}).get("next_cursor")
+        if not page.get("has_more") or not cursor:
+            return
+
+
 async def delete_task(ts: str, client: AsyncWebClient):
-    messages = await client.conversations_replies(
-        channel=env.slack_request_channel, ts=ts
-    )
-    for message in messages["messages"]:
+    # Each page is queued as soon as it arrives, so deletion starts while
+    # the rest of a long thread is still being fetched
+    async for message in iter_replies(client, env.slack_request_channel, ts):
         add_message_to_delete_queue(
             channel_id=env.slack_request_channel, message_ts=message["ts"]
         )
 
 
-
 async def handle_mark_resolved(
     ts,
     resolver_id,
     client: AsyncWebClient,
     message: bool = True,
     custom_response: str | None = None
-):
+) -> Dict[str, Any] | None:
+    """Resolves the thread, returns the resolved help request or None if there was none"""
     # channel_name = await client.conversations_info(channel=env.slack_support_channel)
     # if not channel_name["channel"]["is_channel"]:
     #     return
@@ -31,7 +48,7 @@ async def handle_mark_resolved(
 
     task = asyncio.create_task(delete_task(ts, client))
 
-    res = env.airtable.resolve_request(ts, resolver_id)
+    res = await env.airtable.resolve_request(ts, resolver_id)
     if not res:
         return
     
@@ -68,3 +85,4 @@ async def handle_mark_resolved(
         )
     
     await task
+    return res
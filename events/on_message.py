@@ -3,8 +3,12 @@ from slack_sdk.web.async_client import AsyncWebClient
 from typing import Dict, Any
 
 from events.macros import handle_execute_macro
+from utils.airtable_api import AirtableUnavailable
 from utils.info import get_user_info
+from utils.people import help_request_count
 from utils.env import env
+from utils.users import get_user
+from views.ticket import get_blocks as get_ticket_blocks
 from events.mark_resolved import delete_task
 
 async def handle_message(body: Dict[str, Any], client: AsyncWebClient, say):
@@ -56,7 +60,7 @@ async def handle_message(body: Dict[str, Any], client: AsyncWebClient, say):
 
 
 async def handle_new_support_response(body: Dict[str, Any], client: AsyncWebClient):
-    req = env.airtable.get_request(body["event"]["thread_ts"])
+    req = await env.airtable.get_request(body["event"]["thread_ts"])
     if not req:
         return
     try:
@@ -75,7 +79,7 @@ async def handle_new_support_response(body: Dict[str, Any], client: AsyncWebClie
     if not req_msg or not req_msg.get("messages"):
         return
 
-    user = await client.users_info(user=body["event"]["user"])
+    user = await get_user(client, body["event"]["user"])
     text = body["event"].get("text", "")
 
     if body["event"].get("files"):
@@ -91,121 +95,134 @@ async def handle_new_support_response(body: Dict[str, Any], client: AsyncWebClie
         channel=env.slack_request_channel,
         thread_ts=req["fields"]["internal_thread"],
         text=text,
-        username=user["user"]["profile"]["display_name"] or user["user"]["real_name"],
-        icon_url=user["user"]["profile"]["image_48"],
+        username=user["profile"]["display_name"] or user["real_name"],
+        icon_url=user["profile"]["image_48"],
         unfurl_links=True,
         unfurl_media=True
     )
 
 
 async def handle_new_message(body: Dict[str, Any], client: AsyncWebClient):
-    user = await client.users_info(user=body["event"]["user"])
-
-    airtable_user = env.airtable.get_person(user["user"]["id"])
-    if not airtable_user:
-        forename = user["user"]["profile"]["first_name"]
-        surname = user["user"]["profile"]["last_name"]
-        slack_id = user["user"]["id"]
-        email = user["user"]["profile"].get("email")
-        env.airtable.create_person(forename, surname, email, slack_id)
-        count = 0
-    else:
-        count = len(airtable_user.get("fields", {}).get("help_requests", []))
+    # Steps only wait on what they depend on; everything else runs concurrently
+    user_info_task = asyncio.create_task(get_user_info_if_available(body["event"]["user"]))
 
-    await client.reactions_add(
-        channel=env.slack_support_channel,
-        name="thinking_face",
-        timestamp=body["event"]["ts"],
-    )
+    person_task = asyncio.create_task(env.airtable.get_person(body["event"]["user"]))
+    create_person_task: asyncio.Task | None = None
+    try:
+        user = await get_user(client, body["event"]["user"])
+        lookup_failed = False
+        try:
+            airtable_user = await person_task
+        except AirtableUnavailable:
+            # Relay anyway. They may well exist, so creating them is queued and
+            # the replay checks again, and their request count is unknown.
+            airtable_user = None
+            lookup_failed = True
+
+        count: int | None = None
+        if not airtable_user:
+            forename = user["profile"]["first_name"]
+            surname = user["profile"]["last_name"]
+            slack_id = user["id"]
+            email = user["profile"].get("email")
+            create_person_task = asyncio.create_task(
+                env.airtable.create_person(forename, surname, email, slack_id, queue=lookup_failed)
+            )
+            if not lookup_failed:
+                count = 0
+        else:
+            count = help_request_count(airtable_user)
 
-    if count == 0:
-        await client.chat_postMessage(
+        reaction = client.reactions_add(
             channel=env.slack_support_channel,
-            thread_ts=body["event"]["ts"],
-            text=f"hey there {user["user"]["profile"]["display_name"] or user["user"]["real_name"]}! it looks like this is your first time in the support channel. We've recieved your question and will get back to you as soon as possible. In the meantime, feel free to check out our <https://hack.club/high-seas-faq|FAQ> for answers to common questions. If you have any more questions, please make a new post in <#{env.slack_support_channel}> so we can help you quicker!",
+            name="thinking_face",
+            timestamp=body["event"]["ts"],
+        )
+
+        if count == 0:
+            reply = client.chat_postMessage(
+                channel=env.slack_support_channel,
+                thread_ts=body["event"]["ts"],
+                text=f"hey there {user["profile"]["display_name"] or user["real_name"]}! it looks like this is your first time in the support channel. We've recieved your question and will get back to you as soon as possible. In the meantime, feel free to check out our <https://hack.club/high-seas-faq|FAQ> for answers to common questions. If you have any more questions, please make a new post in <#{env.slack_support_channel}> so we can help you quicker!",
+                unfurl_links=True,
+                unfurl_media=True
+            )
+        else:
+            reply = client.chat_postMessage(
+                channel=env.slack_support_channel,
+                thread_ts=body["event"]["ts"],
+                text =f"Hey! Since there are lot of messages, we may not be able to respond to everybody. However, please check out this <https://hackclub.slack.com/docs/T0266FRGM/F08B1APQUFR|FAQ> to see if your issue is already answered! If it is, react to the original message with :white_check_mark: to mark it as resolved!",
+                unfurl_links=True,
+                unfurl_media=True
+            )
+
+        thread_url = f"https://hackclub.slack.com/archives/{env.slack_support_channel}/p{body['event']['ts'].replace('.', '')}"
+        new_blocks = get_ticket_blocks(user["id"], count, thread_url)
+
+        relay = client.chat_postMessage(
+            channel=env.slack_request_channel,
+            blocks=new_blocks,
+            text="",
+            username=user["profile"]["display_name"] or user["real_name"],
+            icon_url=user["profile"]["image_48"],
             unfurl_links=True,
             unfurl_media=True
         )
-    if count > 0:
+
+        # Only the relay is needed to track the request. Reacting or replying can
+        # fail on its own, e.g. when the asker already deleted their message.
+        reacted, replied, msg = await asyncio.gather(reaction, reply, relay, return_exceptions=True)
+        for step, result in (("react to", reacted), ("reply to", replied)):
+            if isinstance(result, Exception):
+                print(f"Failed to {step} {body['event']['ts']}: {result}")
+        if isinstance(msg, BaseException):
+            raise msg
+
+        # The help request links to the person, so it has to exist first
+        if create_person_task:
+            await create_person_task
+
+        _, data_blocks = await asyncio.gather(
+            env.airtable.create_request(
+                pub_thread_ts=body["event"]["ts"],
+                content=body["event"]["text"],
+                user_id=body["event"]["user"],
+                priv_thread_ts=msg["ts"],
+            ),
+            user_info_task,
+        )
+        if not data_blocks:
+            return
+
         await client.chat_postMessage(
-            channel=env.slack_support_channel,
-            thread_ts=body["event"]["ts"],
-            text =f"Hey! Since there are lot of messages, we may not be able to respond to everybody. However, please check out this <https://hackclub.slack.com/docs/T0266FRGM/F08B1APQUFR|FAQ> to see if your issue is already answered! If it is, react to the original message with :white_check_mark: to mark it as resolved!",
+            channel=env.slack_request_channel,
+            thread_ts=msg["ts"],
+            blocks=data_blocks,
             unfurl_links=True,
             unfurl_media=True
-        )    
-
-    thread_url = f"https://hackclub.slack.com/archives/{env.slack_support_channel}/p{body['event']['ts'].replace('.', '')}"
-    new_blocks = [
-        {
-            "type": "context",
-            "elements": [
-                {
-                    "type": "mrkdwn",
-                    "text": f"Submitted by <@{user['user']['id']}>. They have {count} other help requests. <{thread_url}|Go to thread>",
-                }
-            ],
-        },
-        {
-            "type": "actions",
-            "elements": [
-                {
-                    "type": "button",
-                    "text": {"type": "plain_text", "text": "Use Macro"},
-                    "value": "use-macro",
-                    "action_id": "use-macro",
-                },
-                {
-                    "type": "button",
-                    "text": {"type": "plain_text", "text": "Open Ticket"},
-                    "value": "mark-bug",
-                    "action_id": "mark-bug",
-                },
-                {
-                    "type": "button",
-                    "text": {"type": "plain_text", "text": "Mark Resolved"},
-                    "style": "primary",
-                    "value": "mark-resolved",
-                    "action_id": "mark-resolved",
-                },
-            ],
-        },
-    ]
-
-    msg = await client.chat_postMessage(
-        channel=env.slack_request_channel,
-        blocks=new_blocks,
-        text="",
-        username=user["user"]["profile"]["display_name"] or user["user"]["real_name"],
-        icon_url=user["user"]["profile"]["image_48"],
-        unfurl_links=True,
-        unfurl_media=True
-    )
+        )
+    finally:
+        # Nothing is left running, or with an unretrieved error, if a step failed
+        tasks = [task for task in (user_info_task, person_task, create_person_task) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-    env.airtable.create_request(
-        pub_thread_ts=body["event"]["ts"],
-        content=body["event"]["text"],
-        user_id=body["event"]["user"],
-        priv_thread_ts=msg["ts"],
-    )
-    
-    data_blocks = get_user_info(body["event"]["user"])
-    
-    await client.chat_postMessage(
-        channel=env.slack_request_channel,
-        thread_ts=msg["ts"],
-        blocks=data_blocks,
-        unfurl_links=True,
-        unfurl_media=True
-    )
+
+async def get_user_info_if_available(user_id: str):
+    # The user data card is only informational, so it is skipped while Airtable is down
+    try:
+        return await get_user_info(user_id)
+    except AirtableUnavailable:
+        return None
 
 
 async def handle_edited_message(body: Dict[str, Any], client: AsyncWebClient, ts: str):
     return  # Will be implemented later
     if body["event"]["channel"] == env.slack_support_channel:
-        req = env.airtable.get_request(pub_thread_ts=ts)
+        req = await env.airtable.get_request(pub_thread_ts=ts)
     else:
-        req = env.airtable.get_request(priv_thread_ts=ts)
+        req = await env.airtable.get_request(priv_thread_ts=ts)
 
     if not req:
         print("no req")
@@ -263,7 +280,7 @@ async def handle_deleted_message(body: Dict[str, Any], client: AsyncWebClient):
 
 
 async def handle_new_request_message(body: Dict[str, Any], client: AsyncWebClient):
-    req = env.airtable.get_request(priv_thread_ts=body["event"]["thread_ts"])
+    req = await env.airtable.get_request(priv_thread_ts=body["event"]["thread_ts"])
     if not req:
         return
 
@@ -271,18 +288,21 @@ async def handle_new_request_message(body: Dict[str, Any], client: AsyncWebClien
     if ":shushing_face:" in text or text.startswith("!"):
         return
     elif text.startswith("?"):
-        try:
-            macro = next(iter(x for x in env.airtable.get_macros(body["event"]["user"]) if x.name.lower() == text.lstrip("?").strip().lower()))
+        name = text.lstrip("?")
+        macro = await env.airtable.find_macro(body["event"]["user"], name)
+        if macro:
             await handle_execute_macro(body["event"]["user"], macro, body["event"]["thread_ts"], client)
-        except StopIteration:
+        else:
+            suggestions = await env.airtable.suggest_macros(body["event"]["user"], name)
+            hint = f" Did you mean {', '.join(f'`?{x.name}`' for x in suggestions)}?" if suggestions else ""
             await client.chat_postMessage(
                 channel=env.slack_request_channel,
                 thread_ts=body["event"]["thread_ts"],
-                text=f"Couldn't find that macro <@{body["event"]["user"]}>",
+                text=f"Couldn't find that macro <@{body["event"]["user"]}>.{hint}",
             )
         return
 
-    user = await client.users_info(user=body["event"]["user"])
+    user = await get_user(client, body["event"]["user"])
     text = body["event"].get("text", "")
 
     if body["event"].get("files"):
@@ -298,8 +318,8 @@ async def handle_new_request_message(body: Dict[str, Any], client: AsyncWebClien
         channel=env.slack_support_channel,
         thread_ts=req["fields"]["identifier"],
         text=text,
-        username=user["user"]["profile"]["display_name"] or user["user"]["real_name"],
-        icon_url=user["user"]["profile"]["image_48"],
+        username=user["profile"]["display_name"] or user["real_name"],
+        icon_url=user["profile"]["image_48"],
         unfurl_links=True,
         unfurl_media=True
     )
@@ -5,20 +5,28 @@ from utils.env import env
 
 
 async def handle_reaction(body: Dict[str, Any], client: AsyncWebClient):
-    if body["event"]["reaction"] == "white_check_mark":
-        help_event = env.airtable.get_request(pub_thread_ts=body["event"]["item"]["ts"])
-        try:
-            if help_event["fields"]["status"] == "resolved":
-                return
-        except KeyError:
-            pass
-        ts = help_event["fields"]["internal_thread"]
-        resolver_id = body["event"]["user"]
-        OG_slack_asker_airtable_id = help_event["fields"]["person"][0]
-        OG_slack_asker = env.airtable.get_person_by_id(OG_slack_asker_airtable_id)
-        if OG_slack_asker:
-            OG_slack_asker_slackid = OG_slack_asker["fields"]["slack_id"]
-        else:
-            OG_slack_asker_slackid = None
-        if OG_slack_asker_slackid == resolver_id:
-            await handle_mark_resolved(ts, resolver_id, client)
+    event = body["event"]
+    if event["reaction"] != "white_check_mark":
+        return
+    if event["item"].get("channel") != env.slack_support_channel:
+        return
+
+    # Once the thread index is warm it holds every open ticket, so reactions
+    # on replies, resolved tickets or other messages are dropped without I/O
+    if env.airtable.threads.warmed:
+        help_event = env.airtable.threads.get(pub_thread_ts=event["item"]["ts"])
+    else:
+        help_event = await env.airtable.get_request(pub_thread_ts=event["item"]["ts"])
+    if not help_event or help_event["fields"].get("status") == "resolved":
+        return
+
+    people = help_event["fields"].get("person")
+    if not people:
+        return
+
+    ts = help_event["fields"]["internal_thread"]
+    resolver_id = event["user"]
+    # Usually cached, the asker's record is looked up when they open the ticket
+    OG_slack_asker = await env.airtable.get_person_by_id(people[0])
+    if OG_slack_asker and OG_slack_asker["fields"].get("slack_id") == resolver_id:
+        await handle_mark_resolved(ts, resolver_id, client)
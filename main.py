@@ -1,53 +1,175 @@
 from sentry_sdk import init, profiler
-from slack_bolt.async_app import AsyncAck, AsyncApp, AsyncRespond
+from slack_bolt import BoltResponse
+from slack_bolt.async_app import AsyncAck, AsyncApp, AsyncBoltContext, AsyncRespond
+from slack_sdk.http_retry.builtin_async_handlers import AsyncConnectionErrorRetryHandler, AsyncRateLimitErrorRetryHandler
 from slack_sdk.web.async_client import AsyncWebClient
 from slack_bolt.adapter.starlette.async_handler import AsyncSlackRequestHandler
 from starlette.applications import Starlette
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from starlette.requests import Request
 from starlette.routing import Route
 
-from threading import Thread
+import asyncio
+import re
+from contextlib import asynccontextmanager
 from typing import Dict, Any
 
+from events.bulk_resolve import handle_bulk_resolve
 from events.macros import create_macro, handle_execute_macro
 from events.on_reaction import handle_reaction
-from utils.info import get_user_info
+from utils.cache import TTLCache
+from utils.info import get_user_info, info_cache, prefetch_user_info
 from utils.env import env
-from utils.queue import process_queue
+from utils.github import github
+from utils.jobs import jobs
+from utils.lifeguards import NO_PERMISSION_MESSAGE, is_lifeguard, lifeguards
+from utils.macros import message_text
+from utils.metrics import MeteredWebClient, measure_listener, registry
+from utils.users import update_user, user_cache
+from utils.queue import delete_scheduler
 from events.on_message import handle_message
 from events.mark_resolved import handle_mark_resolved
 from events.direct_to_faq import handle_direct_to_faq
 from events.mark_bug import handle_mark_bug
 from views.create_bug import get_modal as create_bug_modal
-from views.use_macro import get_modal as create_macro_modal
+from views.use_macro import get_modal as create_macro_modal, page_cache
 from views.create_macro import get_modal as create_create_macro_modal
 
 init(env.sentry_dsn, traces_sample_rate=1.0)
 profiler.start_profiler()
-app = AsyncApp(token=env.slack_bot_token, signing_secret=env.slack_signing_secret)
+# Listeners hand slow work to the job queue (utils/jobs.py), so Slack gets its ack in time
+app = AsyncApp(
+    # Waits out Retry-After on ratelimited responses instead of failing
+    client=MeteredWebClient(
+        token=env.slack_bot_token,
+        retry_handlers=[
+            AsyncConnectionErrorRetryHandler(),
+            AsyncRateLimitErrorRetryHandler(max_retry_count=2),
+        ],
+    ),
+    signing_secret=env.slack_signing_secret,
+)
+
+# Slack retries an event up to 3 times within about 5 minutes
+seen_events: TTLCache[str, bool] = TTLCache(maxsize=10_000, ttl=10 * 60)
+
+
+@app.middleware
+async def skip_duplicate_events(body: Dict[str, Any], next):
+    event_id = body.get("event_id")
+    if event_id:
+        if event_id in seen_events:
+            return BoltResponse(status=200, body="")
+        seen_events.set(event_id, True)
+    await next()
+
+
+@app.middleware
+async def meter_slack_client(context: AsyncBoltContext, next):
+    # Bolt gives each request a new plain AsyncWebClient, this swaps in a metered one
+    context["client"] = MeteredWebClient.copy_of(context.client)
+    await next()
+
+
+caches: Dict[str, TTLCache] = {
+    "slack_users": user_cache,
+    "people_by_slack_id": env.airtable.people.by_slack_id,
+    "people_by_id": env.airtable.people.by_id,
+    "user_info": info_cache,
+    "macros": env.airtable.macros._cache,
+    "macro_pages": page_cache,
+    "github_issues": github.issue_cache,
+}
+registry.gauge(
+    "boatswain_cache_hits_total", "Cache lookups that hit", ["cache"],
+    lambda: {(name,): cache.hits for name, cache in caches.items()}, kind="counter",
+)
+registry.gauge(
+    "boatswain_cache_misses_total", "Cache lookups that missed", ["cache"],
+    lambda: {(name,): cache.misses for name, cache in caches.items()}, kind="counter",
+)
+registry.gauge(
+    "boatswain_cache_hit_ratio", "Share of cache lookups that hit", ["cache"],
+    lambda: {(name,): cache.hit_ratio for name, cache in caches.items()},
+)
+registry.gauge(
+    "boatswain_delete_queue_depth", "Messages waiting to be deleted", [],
+    lambda: {(): delete_scheduler.queue.qsize()},
+)
+registry.gauge(
+    "boatswain_delete_queue_drain_rate", "Messages deleted per second over the last minute", [],
+    lambda: {(): delete_scheduler.drain_rate()},
+)
+registry.gauge(
+    "boatswain_jobs", "Background jobs by state", ["state"],
+    lambda: {("pending",): jobs.pending, ("running",): jobs.running},
+)
+registry.gauge(
+    "boatswain_airtable_circuit_open", "1 while the Airtable circuit breaker is open", [],
+    lambda: {(): int(env.airtable.breaker.state == "open")},
+)
+registry.gauge(
+    "boatswain_airtable_outbox_depth", "Airtable writes waiting to be replayed", [],
+    lambda: {(): len(env.airtable.outbox)},
+)
 
 
 async def ping(request):
-    airtable_up = env.airtable.ping()
+    airtable_up = await env.airtable.ping()
     if not airtable_up:
-        return JSONResponse(
-            {"status": "ERROR", "message": "Cannot reach Airtable"}
-        )
+        # Relaying carries on from the thread index and writes wait in the outbox
+        return JSONResponse({
+            "status": "DEGRADED",
+            "message": "Cannot reach Airtable",
+            "airtable": env.airtable.breaker.stats(),
+            "outbox": env.airtable.outbox.stats(),
+        })
     return JSONResponse({
         "status": "OK",
-        "message": "App is running"
+        "message": "App is running",
+        "airtable": env.airtable.breaker.stats(),
+        "outbox": env.airtable.outbox.stats(),
+        "delete_queue": delete_scheduler.stats(),
+        "jobs": jobs.stats(),
+        "mirror": sorted(env.airtable.mirror.ready) if env.airtable.mirror else None,
     })
 
+
+async def metrics(request):
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def thread_key(event: Dict[str, Any]) -> str | None:
+    """Ordering key for a message event: the ts of the thread it belongs to"""
+    return (
+        event.get("thread_ts")
+        or event.get("previous_message", {}).get("thread_ts")
+        or event.get("ts")
+    )
+
+
 @app.event("message")
+@measure_listener
 async def handle_message_events(body: Dict[str, Any], client: AsyncWebClient, say):
-    await handle_message(body, client, say)
+    jobs.submit(thread_key(body["event"]), lambda: handle_message(body, client, say))
 
 @app.event("reaction_added")
+@measure_listener
 async def handle_reaction_added_events(body: Dict[str, Any], client: AsyncWebClient):
-    await handle_reaction(body, client)
+    jobs.submit(body["event"]["item"].get("ts"), lambda: handle_reaction(body, client))
+
+@app.event("subteam_members_changed")
+@measure_listener
+async def handle_subteam_members_changed_events(body: Dict[str, Any]):
+    lifeguards.apply_change(body["event"])
+
+@app.event("user_change")
+@measure_listener
+async def handle_user_change_events(body: Dict[str, Any]):
+    update_user(body["event"]["user"])
 
 @app.action("mark-resolved")
+@measure_listener
 async def handle_mark_resolved_button(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
@@ -56,19 +178,21 @@ async def handle_mark_resolved_button(
     ts = body["message"]["ts"]
     resolver = body["user"]["id"]
 
-    await handle_mark_resolved(ts=ts, resolver_id=resolver, client=client)
+    jobs.submit(ts, lambda: handle_mark_resolved(ts=ts, resolver_id=resolver, client=client))
 
 
 @app.action("direct-to-faq")
+@measure_listener
 async def handle_direct_to_faq_button(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
     await ack()
 
-    await handle_direct_to_faq(body, client)
+    jobs.submit(body["message"]["ts"], lambda: handle_direct_to_faq(body, client))
 
 
 @app.action("mark-bug")
+@measure_listener
 async def handle_mark_bug_button(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
@@ -78,36 +202,41 @@ async def handle_mark_bug_button(
 
 
 @app.view("create_issue")
+@measure_listener
 async def handle_create_bug_view(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
     await ack()
 
-    await handle_mark_bug(body, client)
+    ts = body["view"]["blocks"][-1]["block_id"]
+    jobs.submit(ts, lambda: handle_mark_bug(body, client))
 
 
 @app.action("use-macro")
+@measure_listener
 async def handle_use_macro_button(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
     await ack()
 
-    view = create_macro_modal(body["message"]["ts"], body["user"]["id"])
+    view = await create_macro_modal(body["message"]["ts"], body["user"]["id"])
     await client.views_open(view=view, trigger_id=body["trigger_id"])
 
 
 @app.action("use-macro-pagination")
+@measure_listener
 async def handle_use_macro_pagination_button(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
     await ack()
     
     [page, ts] = body["actions"][0]["value"].split(";", 1)
-    view = create_macro_modal(ts, body["user"]["id"], int(page))
+    view = await create_macro_modal(ts, body["user"]["id"], int(page))
     await client.views_update(view=view, trigger_id=body["trigger_id"], view_id=body["view"]["root_view_id"])
 
 
 @app.action("execute-macro")
+@measure_listener
 async def handle_execute_macro_view(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
@@ -116,12 +245,50 @@ async def handle_execute_macro_view(
     user_id: str = body["user"]["id"]
     block_value: str = body["actions"][0]["value"]
     [macro_id, ts] = block_value.split(";", 1)
-    macro = env.airtable.get_macros(user_id)[int(macro_id)]
 
-    await handle_execute_macro(user_id, macro, ts, client)
+    async def execute():
+        macro = await env.airtable.get_macro(user_id, macro_id)
+        if macro:
+            await handle_execute_macro(user_id, macro, ts, client)
+
+    jobs.submit(ts, execute)
+
+
+@app.options("search-macro")
+@measure_listener
+async def handle_search_macro_options(ack: AsyncAck, body: Dict[str, Any]):
+    options = []
+    for owner, macro in env.airtable.search_macros(body["value"]):
+        text = message_text(macro.message)
+        options.append({
+            "text": {"type": "plain_text", "text": macro.name[:75]},
+            "description": {"type": "plain_text", "text": (text[:72] + "...") if len(text) > 75 else text or " "},
+            "value": f"{owner};{macro.id}",
+        })
+    await ack(options=options)
+
+
+@app.action("search-macro")
+@measure_listener
+async def handle_search_macro_select(
+    ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
+):
+    await ack()
+
+    user_id: str = body["user"]["id"]
+    [owner, macro_id] = body["actions"][0]["selected_option"]["value"].split(";", 1)
+    ts: str = body["view"]["private_metadata"]
+
+    async def execute():
+        macro = await env.airtable.get_macro(owner, macro_id)
+        if macro:
+            await handle_execute_macro(user_id, macro, ts, client)
+
+    jobs.submit(ts, execute)
 
 
 @app.action("create-macro")
+@measure_listener
 async def handle_create_macro_view(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
@@ -130,6 +297,7 @@ async def handle_create_macro_view(
 
 
 @app.action("delete-macro")
+@measure_listener
 async def handle_delete_macro_view(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
@@ -139,12 +307,13 @@ async def handle_delete_macro_view(
     block_value: str = body["actions"][0]["value"]
     [macro_id, ts] = block_value.split(";", 1)
     
-    env.airtable.delete_macro(user_id, int(macro_id))
-    view = create_macro_modal(ts, user_id)
+    await env.airtable.delete_macro(user_id, macro_id)
+    view = await create_macro_modal(ts, user_id)
     await client.views_update(view=view, trigger_id=body["trigger_id"], view_id=body["view"]["root_view_id"])
 
 
 @app.view_submission("create_macro")
+@measure_listener
 async def handle_create_macro_view_submission(
     ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient
 ):
@@ -157,25 +326,44 @@ async def handle_create_macro_view_submission(
     )
 
 @app.command("/hs-lookup")
+@measure_listener
 async def hs_lookup(ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient, respond: AsyncRespond):
     await ack()
     user_id = body["user_id"]
-    lifeguards = await client.usergroups_users_list(usergroup="S07U41270QN")
-    if user_id not in lifeguards.get("users", []):
-        return await respond("You do not have permission to use this command. If you think this is a mistake, please message <@U054VC2KM9P>")
-    
-    target = body["text"].split("|")[0][2:]
-    
-    blocks = get_user_info(target)
+    if not await is_lifeguard(client, user_id):
+        return await respond(NO_PERMISSION_MESSAGE)
     
+    # Slack allows at most 50 blocks per message, one per user
+    targets = list(dict.fromkeys(re.findall(r"<@(\w+)(?:\|[^>]*)?>", body["text"])))[:50]
+    if not targets:
+        return await respond("Usage: `/hs-lookup @user [@user ...]`")
+
+    if len(targets) > 1:
+        await prefetch_user_info(targets)
+    blocks = [
+        block
+        for user_blocks in await asyncio.gather(*(get_user_info(target) for target in targets))
+        for block in user_blocks
+    ]
+
     await respond(
         blocks=blocks,
         unfurl_links=True,
         unfurl_media=True,
-        text=f"High Seas user information for <@{target}>"
+        text=f"High Seas user information for {', '.join(f'<@{target}>' for target in targets)}"
     )
 
 
+@app.command("/hs-bulk")
+@measure_listener
+async def hs_bulk(ack: AsyncAck, body: Dict[str, Any], client: AsyncWebClient, respond: AsyncRespond):
+    await ack()
+    if not await is_lifeguard(client, body["user_id"]):
+        return await respond(NO_PERMISSION_MESSAGE)
+
+    jobs.submit(None, lambda: handle_bulk_resolve(body, client, respond))
+
+
 app_handler = AsyncSlackRequestHandler(app)
 
 
@@ -183,8 +371,28 @@ app_handler = AsyncSlackRequestHandler(app)
 async def endpoint(req: Request):
     return await app_handler.handle(req)
 
-queue_thread = Thread(target=process_queue, daemon=True).start()
-api = Starlette(debug=True, routes=[Route("/slack/events", endpoint=endpoint, methods=["POST"]), Route("/ping", endpoint=ping, methods=['GET'])])
+@asynccontextmanager
+async def lifespan(_: Starlette):
+    for name, warm in (
+        ("thread index", env.airtable.warm_thread_index()),
+        ("macro library", env.airtable.warm_macros()),
+    ):
+        try:
+            await warm
+        except Exception as e:
+            print(f"Failed to warm {name}: {e}")
+    env.airtable.start()
+    delete_scheduler.start()
+    lifeguards.start(app.client)
+    yield
+    await lifeguards.stop()
+    await jobs.drain()
+    await delete_scheduler.stop()
+    await github.close()
+    await env.airtable.close()
+
+
+api = Starlette(debug=True, routes=[Route("/slack/events", endpoint=endpoint, methods=["POST"]), Route("/ping", endpoint=ping, methods=['GET']), Route("/metrics", endpoint=metrics, methods=['GET'])], lifespan=lifespan)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,113 @@
+import itertools
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+MODIFIED_AFTER = re.compile(r'IS_AFTER\(LAST_MODIFIED_TIME\(\), DATETIME_PARSE\("([^"]+)"\)\)')
+EQ = re.compile(r'^\{([^}]+)\} = "([^"]*)"$')
+
+
+class FakeAirtable:
+    """Just enough of Airtable's REST API to run the client against.
+
+    listRecords understands the modified-after formula the mirror polls
+    with and a single `{field} = "value"` comparison. Other formulas match
+    every record. Set `fail` to a status code to fail every request with it.
+    """
+
+    def __init__(self):
+        # table -> record id -> (fields, last modified time)
+        self.tables: Dict[str, Dict[str, tuple]] = {"help": {}, "people": {}}
+        # (method, table, request body) of every call
+        self.requests: List[tuple] = []
+        self.fail: int | None = None
+        self._ids = itertools.count(1)
+        self.app = web.Application()
+        self.app.router.add_post("/v0/{base}/{table}/listRecords", self.list_records)
+        self.app.router.add_post("/v0/{base}/{table}", self.create_records)
+        self.app.router.add_patch("/v0/{base}/{table}", self.update_records)
+
+    def put(self, table: str, record_id: str, fields: Dict[str, Any], modified: float | None = None):
+        self.tables[table][record_id] = (fields, time.time() if modified is None else modified)
+
+    def fields(self, table: str, record_id: str) -> Dict[str, Any]:
+        return self.tables[table][record_id][0]
+
+    def find(self, table: str, field: str, value: Any) -> List[str]:
+        return [
+            record_id
+            for record_id, (fields, _) in self.tables[table].items()
+            if fields.get(field) == value
+        ]
+
+    def _record(self, table: str, record_id: str, names=None) -> Dict[str, Any]:
+        fields = self.fields(table, record_id)
+        return {
+            "id": record_id,
+            "createdTime": "",
+            "fields": {k: v for k, v in fields.items() if names is None or k in names},
+        }
+
+    async def _start(self, request: web.Request) -> tuple:
+        table = request.match_info["table"]
+        body = await request.json()
+        self.requests.append((request.method, table, body))
+        return table, body
+
+    def _failure(self) -> web.Response | None:
+        if self.fail is None:
+            return None
+        return web.json_response(
+            {"error": {"type": "FAKE_FAILURE"}}, status=self.fail, headers={"Retry-After": "0"}
+        )
+
+    async def list_records(self, request: web.Request) -> web.Response:
+        table, body = await self._start(request)
+        if (failure := self._failure()) is not None:
+            return failure
+
+        formula = body.get("filterByFormula", "")
+        since = None
+        if match := MODIFIED_AFTER.search(formula):
+            parsed = datetime.strptime(match.group(1), "%Y-%m-%dT%H:%M:%S.000Z")
+            since = parsed.replace(tzinfo=timezone.utc).timestamp()
+        eq = EQ.match(formula)
+        records = [
+            self._record(table, record_id, body.get("fields"))
+            for record_id, (fields, modified) in self.tables[table].items()
+            if (since is None or modified > since)
+            and (eq is None or str(fields.get(eq.group(1))) == eq.group(2))
+        ]
+        return web.json_response({"records": records[: body.get("maxRecords")]})
+
+    async def create_records(self, request: web.Request) -> web.Response:
+        table, body = await self._start(request)
+        if (failure := self._failure()) is not None:
+            return failure
+
+        created = []
+        for record in body["records"]:
+            record_id = f"rec{next(self._ids)}"
+            self.put(table, record_id, dict(record["fields"]))
+            created.append(self._record(table, record_id))
+        return web.json_response({"records": created})
+
+    async def update_records(self, request: web.Request) -> web.Response:
+        table, body = await self._start(request)
+        if (failure := self._failure()) is not None:
+            return failure
+
+        # Like Airtable, one bad record id rejects the whole batch
+        for record in body["records"]:
+            if record["id"] not in self.tables[table]:
+                return web.json_response(
+                    {"error": {"type": "ROW_DOES_NOT_EXIST", "message": record["id"]}}, status=422
+                )
+        for record in body["records"]:
+            self.put(table, record["id"], {**self.fields(table, record["id"]), **record["fields"]})
+        return web.json_response(
+            {"records": [self._record(table, record["id"]) for record in body["records"]]}
+        )
@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from tests.fake_airtable import FakeAirtable
+from utils.airtable import PENDING_PREFIX, AirtableManager
+from utils.airtable_api import AirtableUnavailable
+
+
+def run(test):
+    async def wrapper(tmp_path):
+        fake = FakeAirtable()
+        fake.put("people", "recU1", {"slack_id": "U1", "help_request_count": 1})
+        async with TestServer(fake.app) as server:
+            airtable = AirtableManager(
+                "key",
+                # A base of its own, so the shared per-base rate limit starts full
+                f"app{uuid.uuid4().hex}",
+                base_url=str(server.make_url("/v0")),
+                outbox_path=str(tmp_path / "outbox.sqlite3"),
+            )
+            airtable.start()
+            try:
+                await test(fake, airtable)
+            finally:
+                await airtable.close()
+
+    return lambda tmp_path: asyncio.run(wrapper(tmp_path))
+
+
+@run
+async def test_person_whose_lookup_failed_is_not_duplicated(fake, airtable):
+    fake.fail = 503
+    with pytest.raises(AirtableUnavailable):
+        await airtable.get_person("U1")
+    # A single failure leaves the breaker closed, but the create is still queued
+    assert airtable.breaker.state == "closed"
+    fake.fail = None
+
+    person = await airtable.create_person("Ada", "Lovelace", "ada@example.com", "U1", queue=True)
+    assert person["id"] == f"{PENDING_PREFIX}U1"
+    await airtable.flush()
+    assert list(fake.tables["people"]) == ["recU1"]
+
+    await airtable.outbox.replay()
+    assert len(airtable.outbox) == 0
+    assert fake.find("people", "slack_id", "U1") == ["recU1"]
+
+
+@run
+async def test_writes_to_a_pending_request_wait_for_it(fake, airtable):
+    fake.put("help", "recOld", {"identifier": "0.1", "internal_thread": "0.2", "status": "open"})
+
+    fake.fail = 503
+    req = await airtable.create_request("1.1", "help!", "U1", "2.1")
+    assert req["id"] == f"{PENDING_PREFIX}1.1"
+
+    # Queued behind the create rather than sent with the placeholder id
+    fake.fail = None
+    updated = await airtable.update_request(
+        priv_thread_ts="2.1", updates={"status": "responded", "bug_report": True}
+    )
+    assert updated["id"] == f"{PENDING_PREFIX}1.1"
+    assert updated["fields"]["status"] == "responded"
+    assert airtable.threads.get(priv_thread_ts="2.1")["fields"]["bug_report"] is True
+    # Later writes also queue, so they replay after the ones before them
+    await airtable.update_request(priv_thread_ts="0.2", updates={"status": "responded"})
+    assert len(airtable.outbox) == 3
+    assert not [r for r in fake.requests if r[0] == "PATCH"]
+
+    fake.fail = 429
+    await airtable.outbox.replay()
+    assert len(airtable.outbox) == 3
+    assert airtable.outbox.dropped == 0
+
+    fake.fail = None
+    await airtable.outbox.replay()
+    assert len(airtable.outbox) == 0
+    [created] = fake.find("help", "identifier", "1.1")
+    assert fake.fields("help", created) == {
+        "identifier": "1.1",
+        "content": "help!",
+        "person": ["recU1"],
+        "internal_thread": "2.1",
+        "status": "responded",
+        "bug_report": True,
+    }
+    assert fake.fields("help", "recOld")["status"] == "responded"
+    assert airtable.threads.get(priv_thread_ts="2.1")["id"] == created
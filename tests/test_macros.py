@@ -0,0 +1,28 @@
+import json
+
+from utils.macros import Macro, MacroIndex, parse_macros
+
+
+def test_suggest_matches_typos_and_forgets_removed_names():
+    doubloons = Macro("Doubloons missing", {}, False)
+    shop = Macro("Shop order status", {}, False)
+    index = MacroIndex([doubloons, shop, Macro("Ship not showing", {}, False)])
+
+    assert index.suggest("dubloon")[0] is doubloons
+    assert index.suggest("shop ordr")[0] is shop
+    assert index.suggest("") == []
+
+    index.remove(doubloons)
+    assert doubloons not in index.suggest("dubloon")
+    index.add(doubloons)
+    assert index.suggest("dubloon")[0] is doubloons
+
+
+def test_parse_gives_duplicate_entries_the_same_ids_every_time():
+    entry = {"name": "Doubloons", "message": {"text": "hi"}, "close": False}
+    raw = json.dumps([entry, entry, {**entry, "id": "abc"}, {**entry, "id": "abc"}])
+
+    ids = [macro.id for macro in parse_macros(raw)]
+    assert len(set(ids)) == 4
+    assert ids[2] == "abc"
+    assert [macro.id for macro in parse_macros(raw)] == ids
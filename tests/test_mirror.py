@@ -0,0 +1,119 @@
+import asyncio
+import sqlite3
+import time
+import uuid
+
+from aiohttp.test_utils import TestServer
+
+from tests.fake_airtable import MODIFIED_AFTER, FakeAirtable
+from utils.airtable_api import AsyncApi
+from utils.mirror import AirtableMirror
+
+
+def run(test):
+    async def wrapper(tmp_path):
+        fake = FakeAirtable()
+        async with TestServer(fake.app) as server:
+            # A base of its own, so the shared per-base rate limit starts full
+            api = AsyncApi("key", f"app{uuid.uuid4().hex}", base_url=str(server.make_url("/v0")))
+            mirror = AirtableMirror(api, str(tmp_path / "mirror.sqlite3"), overlap=0)
+            mirror.open()
+            try:
+                await test(fake, mirror, tmp_path)
+            finally:
+                mirror.close()
+                await api.close()
+
+    return lambda tmp_path: asyncio.run(wrapper(tmp_path))
+
+
+@run
+async def test_poll_fetches_rows_changed_since_watermark(fake, mirror, tmp_path):
+    hour_ago = time.time() - 60 * 60
+    fake.put("help", "rec1", {"identifier": "1.1", "internal_thread": "2.1", "status": "open"}, hour_ago)
+    fake.put("help", "rec2", {"identifier": "1.2", "internal_thread": "2.2", "status": "open"}, hour_ago)
+
+    await mirror.sync("help")
+    assert "filterByFormula" not in fake.requests[-1][2]
+    assert "help" in mirror.ready
+    assert mirror.get("help", "internal_thread", "2.2")["id"] == "rec2"
+
+    fake.put("help", "rec2", {"identifier": "1.2", "internal_thread": "2.2", "status": "resolved"})
+    await mirror.sync("help")
+    _, _, body = fake.requests[-1]
+    assert MODIFIED_AFTER.search(body["filterByFormula"])
+    assert body["fields"] == ["identifier", "internal_thread", "status", "person"]
+    assert mirror.rows_synced == 3
+    assert mirror.get("help", "identifier", "1.2")["fields"]["status"] == "resolved"
+    assert mirror.get("help", "identifier", "1.1")["fields"]["status"] == "open"
+
+
+@run
+async def test_full_resync_drops_deleted_rows(fake, mirror, tmp_path):
+    fake.put("people", "recA", {"slack_id": "U1"})
+    fake.put("people", "recB", {"slack_id": "U2"})
+    await mirror.sync("people")
+
+    del fake.tables["people"]["recB"]
+    await mirror.sync("people")
+    # Polling only sees changed rows, so deletions wait for the full resync
+    assert mirror.get("people", "slack_id", "U2") is not None
+
+    await mirror.sync("people", full=True)
+    assert "filterByFormula" not in fake.requests[-1][2]
+    assert mirror.get("people", "slack_id", "U2") is None
+    assert mirror.get("people", "slack_id", "U1")["id"] == "recA"
+
+
+@run
+async def test_computed_fields_resync_on_short_interval(fake, mirror, tmp_path):
+    hour_ago = time.time() - 60 * 60
+    fake.put("people", "recA", {"slack_id": "U1", "help_request_count": 1}, hour_ago)
+    fake.put("help", "rec1", {"identifier": "1.1", "internal_thread": "2.1", "status": "open"}, hour_ago)
+    await mirror.sync("people")
+    await mirror.sync("help")
+
+    # A count field changing doesn't move the record's last modified time
+    fake.put("people", "recA", {"slack_id": "U1", "help_request_count": 2}, hour_ago)
+    await mirror.sync("people")
+    assert MODIFIED_AFTER.search(fake.requests[-1][2]["filterByFormula"])
+    assert mirror.get("people", "slack_id", "U1")["fields"]["help_request_count"] == 1
+
+    mirror.computed_resync_interval = 0
+    await mirror.sync("people")
+    assert "filterByFormula" not in fake.requests[-1][2]
+    assert mirror.get("people", "slack_id", "U1")["fields"]["help_request_count"] == 2
+
+    # Tables without computed fields keep polling
+    await mirror.sync("help")
+    assert MODIFIED_AFTER.search(fake.requests[-1][2]["filterByFormula"])
+
+
+@run
+async def test_changed_fields_resync_table_from_scratch(fake, mirror, tmp_path):
+    fake.put("help", "rec1", {"identifier": "1.1", "internal_thread": "2.1", "status": "open"})
+    fake.put("people", "recA", {"slack_id": "U1"})
+    await mirror.sync("help")
+    await mirror.sync("people")
+    mirror.close()
+
+    # As if the rows were mirrored by a version with a different field list,
+    # and a table that is no longer mirrored was left behind
+    db = sqlite3.connect(tmp_path / "mirror.sqlite3")
+    with db:
+        db.execute("UPDATE mirrored_fields SET fields = '[\"identifier\"]' WHERE table_name = 'help'")
+        db.execute("INSERT INTO records VALUES ('hs_people', 'recX', 'U1', NULL, '{}')")
+        db.execute("INSERT INTO watermarks VALUES ('hs_people', 0, 0)")
+        db.execute("INSERT INTO mirrored_fields VALUES ('hs_people', '[]')")
+    db.close()
+
+    mirror.open()
+    assert mirror.ready == {"people"}
+    assert mirror.get("help", "identifier", "1.1") is None
+    assert mirror.get("people", "slack_id", "U1")["id"] == "recA"
+    for table in ("records", "watermarks", "mirrored_fields"):
+        assert not mirror._db.execute(f"SELECT 1 FROM {table} WHERE table_name = 'hs_people'").fetchall()
+
+    await mirror.sync("help")
+    assert "filterByFormula" not in fake.requests[-1][2]
+    assert mirror.get("help", "identifier", "1.1")["fields"]["status"] == "open"
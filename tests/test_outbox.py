@@ -0,0 +1,73 @@
+import asyncio
+
+from utils.airtable_api import AirtableError, AirtableUnavailable
+from utils.outbox import Outbox
+
+
+class Handlers:
+    """Records replayed writes, failing each op with the next queued error"""
+
+    def __init__(self):
+        self.calls = []
+        self.errors = {}
+
+    def handler(self, op):
+        async def handle(**args):
+            if self.errors.get(op):
+                raise self.errors[op].pop(0)
+            self.calls.append((op, args))
+
+        return handle
+
+
+def make_outbox(tmp_path):
+    handlers = Handlers()
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox._handlers = {op: handlers.handler(op) for op in ("create", "resolve")}
+    return outbox, handlers
+
+
+def test_replays_in_order_and_survives_restart(tmp_path):
+    outbox, handlers = make_outbox(tmp_path)
+    outbox.add("create", {"ts": "1"})
+    outbox.add("resolve", {"ts": "1"})
+    outbox.close()
+
+    outbox, handlers = make_outbox(tmp_path)
+    outbox.open()
+    assert len(outbox) == 2
+    asyncio.run(outbox.replay())
+    assert handlers.calls == [("create", {"ts": "1"}), ("resolve", {"ts": "1"})]
+    assert len(outbox) == 0
+
+    outbox.close()
+    outbox.open()
+    assert len(outbox) == 0
+
+
+def test_stops_while_airtable_is_unavailable_or_rate_limiting(tmp_path):
+    outbox, handlers = make_outbox(tmp_path)
+    outbox.add("create", {"ts": "1"})
+    outbox.add("resolve", {"ts": "1"})
+
+    for error in (AirtableUnavailable(503, "down"), AirtableError(429, "Rate limited after retries")):
+        handlers.errors["create"] = [error]
+        asyncio.run(outbox.replay())
+        # Nothing after the failed entry is replayed ahead of it
+        assert handlers.calls == []
+        assert len(outbox) == 2
+        assert outbox.dropped == 0
+
+    asyncio.run(outbox.replay())
+    assert [op for op, _ in handlers.calls] == ["create", "resolve"]
+
+
+def test_drops_entries_airtable_rejects(tmp_path):
+    outbox, handlers = make_outbox(tmp_path)
+    outbox.add("create", {"ts": "1"})
+    outbox.add("resolve", {"ts": "1"})
+    handlers.errors["create"] = [AirtableError(422, "INVALID_VALUE_FOR_COLUMN")]
+
+    asyncio.run(outbox.replay())
+    assert handlers.calls == [("resolve", {"ts": "1"})]
+    assert outbox.stats() == {"depth": 0, "replayed": 1, "dropped": 1}
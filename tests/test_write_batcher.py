@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any, Dict, List
+
+from utils.airtable_api import AirtableError, WriteBatcher
+
+
+class SlowTable:
+    """Stands in for AsyncTable, taking a while to write each batch"""
+
+    def __init__(self):
+        self.batches: List[List[Dict[str, Any]]] = []
+
+    async def batch_create(self, records):
+        self.batches.append(records)
+        await asyncio.sleep(0.1)
+        if any(record.get("bad") for record in records):
+            raise AirtableError(422, "INVALID_VALUE_FOR_COLUMN")
+        return [{"id": f"rec{i}", "createdTime": "", "fields": record} for i, record in enumerate(records)]
+
+
+def test_flush_waits_for_batches_already_being_sent():
+    async def run():
+        batcher = WriteBatcher(SlowTable())
+        # A full batch starts sending straight away
+        writes = [asyncio.create_task(batcher.create({"n": i})) for i in range(10)]
+        await asyncio.sleep(0.01)
+        assert batcher._flushes
+
+        await batcher.flush()
+        assert all(write.done() for write in writes)
+
+    asyncio.run(run())
+
+
+def test_bad_record_fails_alone():
+    async def run():
+        table = SlowTable()
+        batcher = WriteBatcher(table)
+        good = asyncio.create_task(batcher.create({"n": 1}))
+        bad = asyncio.create_task(batcher.create({"n": 2, "bad": True}))
+        await asyncio.sleep(0.01)
+        await batcher.flush()
+
+        assert good.result()["fields"] == {"n": 1}
+        assert isinstance(bad.exception(), AirtableError)
+        assert len(table.batches) == 3
+
+    asyncio.run(run())
@@ -1,37 +1,129 @@
-import dataclasses
-import json
-from typing import Any, Dict, List
-from pyairtable import Api
+import asyncio
+from typing import Dict, List, Tuple
 from pyairtable.api.types import RecordDict, RecordDeletedDict, WritableFields
 
+from . import formula
+from .airtable_api import AIRTABLE_API_URL, AirtableUnavailable, AsyncApi, WriteBatcher
+from .cache import MISSING
+from .macros import Macro, MacroStore
+from .metrics import airtable_errors, airtable_seconds, measure_methods
+from .mirror import AirtableMirror
+from .outbox import Outbox
+from .people import FRAUD_FIELDS, HS_USER_FIELDS, PERSON_FIELDS, PeopleDirectory
+from .thread_index import INDEX_FIELDS, ThreadIndex
 
-@dataclasses.dataclass
-class Macro:
-    name: str
-    message: Dict[str, Any]
-    close: bool
+# Ids of help requests that are queued in the outbox and not yet in Airtable
+PENDING_PREFIX = "pending-"
 
 
+@measure_methods(airtable_seconds, airtable_errors)
 class AirtableManager:
-    def __init__(self, api_key: str, base_id: str):
-        api = Api(api_key)
-        self.people_table = api.table(base_id, "people")
-        self.hs_people_table = api.table(base_id, "hs_people")
-        self.fraud_data_table = api.table(base_id, "fraud_data")
-        self.help_table = api.table(base_id, "help")
-        self.macro_table = api.table(base_id, "macro")
+    def __init__(
+        self,
+        api_key: str,
+        base_id: str,
+        base_url: str = AIRTABLE_API_URL,
+        mirror_path: str | None = None,
+        outbox_path: str = "airtable_outbox.sqlite3",
+    ):
+        self.api = AsyncApi(api_key, base_id, base_url=base_url)
+        self.people_table = self.api.table("people")
+        self.hs_people_table = self.api.table("hs_people")
+        self.fraud_data_table = self.api.table("fraud_data")
+        self.help_table = self.api.table("help")
+        self.macro_table = self.api.table("macro")
+        self.people_writes = WriteBatcher(self.people_table)
+        self.help_writes = WriteBatcher(self.help_table)
+        self.threads = ThreadIndex()
+        self.people = PeopleDirectory()
+        self.macros = MacroStore(self.macro_table, self.get_person)
+        # Local copy of help and people that serves reads once synced
+        self.mirror = AirtableMirror(self.api, mirror_path) if mirror_path else None
+        # Writes made while Airtable is unavailable, replayed once it recovers
+        self.outbox = Outbox(outbox_path)
         print("Connected to Airtable")
 
-    def ping(self) -> bool:
+    async def warm_thread_index(self):
+        """Loads every open help request into the thread index in one paginated scan"""
+        async for page in self.help_table.iterate(
+            formula=formula.not_(formula.eq("status", "resolved")), fields=INDEX_FIELDS
+        ):
+            self.threads.add_many(page)
+        self.threads.warmed = True
+        print(f"Indexed {len(self.threads)} open help requests")
+
+    def _from_mirror(self, table: str, field: str, value: str) -> RecordDict | None:
+        # Misses still go to Airtable, the row may be newer than the last poll
+        if self.mirror and table in self.mirror.ready:
+            return self.mirror.get(table, field, value)
+        return None
+
+    def _mirror_write(self, table: str, record: RecordDict):
+        if self.mirror:
+            self.mirror.upsert(table, record)
+
+    async def flush(self):
+        """Sends any writes still waiting to be batched"""
+        await asyncio.gather(self.people_writes.flush(), self.help_writes.flush())
+
+    def start(self):
+        if self.mirror:
+            self.mirror.start()
+        self.outbox.start(
+            {
+                "create_person": self._replay_create_person,
+                "create_request": self._replay_create_request,
+                "update_request": self._replay_update_request,
+                "resolve_request": self._resolve_request,
+            }
+        )
+
+    async def close(self):
+        await self.flush()
+        if self.mirror:
+            await self.mirror.stop()
+        await self.outbox.stop()
+        await self.api.close()
+
+    @property
+    def breaker(self):
+        return self.api.breaker
+
+    def _should_queue(self) -> bool:
+        # Queued behind earlier writes so they replay in order
+        return len(self.outbox) > 0 or self.breaker.state == "open"
+
+    async def ping(self) -> bool:
         try:
-            self.people_table.first()
+            await self.people_table.first(fields=["slack_id"])
             return True
         except Exception as e:
             print(f"Error pinging Airtable: {e}")
             return False
 
-    def create_person(self, first_name: str, last_name: str, email: str, slack_id: str) -> RecordDict:
-        return self.people_table.create(
+    async def create_person(
+        self, first_name: str, last_name: str, email: str, slack_id: str, queue: bool = False
+    ) -> RecordDict:
+        """`queue` when the person may already exist, e.g. their lookup failed.
+
+        The replay only creates them if they are still missing.
+        """
+        fields = {
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": email,
+            "slack_id": slack_id,
+        }
+        if not queue and not self._should_queue():
+            try:
+                return await self._create_person(**fields)
+            except AirtableUnavailable as e:
+                print(f"Airtable unavailable, queueing person: {e}")
+        self.outbox.add("create_person", fields)
+        return {"id": f"{PENDING_PREFIX}{slack_id}", "createdTime": "", "fields": fields}
+
+    async def _create_person(self, first_name: str, last_name: str, email: str, slack_id: str) -> RecordDict:
+        person = await self.people_writes.create(
             {
                 "first_name": first_name,
                 "last_name": last_name,
@@ -40,87 +132,153 @@ class AirtableManager:
                 "preexisting_user": True,
             }
         )
+        self.people.add(person)
+        self._mirror_write("people", person)
+        return person
 
-    def get_person(self, user_id: str) -> RecordDict | None:
-        user = self.people_table.first(formula=f'{{slack_id}} = "{user_id}"')
+    async def _replay_create_person(self, first_name: str, last_name: str, email: str, slack_id: str):
+        if not await self.get_person(slack_id):
+            await self._create_person(first_name, last_name, email, slack_id)
+
+    async def get_person(self, user_id: str) -> RecordDict | None:
+        user = self.people.get(user_id)
+        if user is not MISSING:
+            return user
+
+        user = self._from_mirror("people", "slack_id", user_id)
+        if not user:
+            user = await self.people_table.first(
+                formula=formula.eq("slack_id", user_id), fields=PERSON_FIELDS
+            )
+        if user:
+            self.people.add(user)
+        else:
+            self.people.add_missing(user_id)
         return user
-    def get_person_by_id(self, id: str) -> RecordDict | None:
+
+    async def get_person_by_id(self, id: str) -> RecordDict | None:
         """Gets person by their Airtable ID"""
-        user = self.people_table.get(id)
-        return user
-    
-    def get_macros(self, user_id: str) -> List[Macro]:
-        macros = self.macro_table.first(formula=f'{{slack_id}} = "{user_id}"')
-        
-        if macros is None:
-            return []
-        else:
-            assert macros["fields"]["version"] == 1
-            return [Macro(**x) for x in json.loads(macros["fields"]["data"])]
-        
-    def insert_macro(self, user_id: str, macro: Macro) -> RecordDict:
-        macro_dict = dataclasses.asdict(macro)
-        macros = self.macro_table.first(formula=f'{{slack_id}} = "{user_id}"')
-        
-        if macros is None:
-            person = self.get_person(user_id)
-            assert person
-            
-            return self.macro_table.create(
-                {
-                    "slack_id": user_id,
-                    "version": 1,
-                    "data": json.dumps([macro_dict]),
-                    "person": [person["id"]]
-                }
-            )
+        user = self.people.get_by_id(id)
+        if user is not MISSING:
+            return user
+
+        user = None
+        if self.mirror and "people" in self.mirror.ready:
+            user = self.mirror.get_by_id("people", id)
+        if not user:
+            user = await self.people_table.first(formula=formula.record_id(id), fields=PERSON_FIELDS)
+        if user:
+            self.people.add(user)
         else:
-            assert macros["fields"]["version"] == 1
-            return self.macro_table.update(
-                macros["id"],
-                {
-                    "version": 1,
-                    "data": json.dumps([*json.loads(macros["fields"]["data"]), macro_dict])
-                }
-            )
+            self.people.add_missing_id(id)
+        return user
     
-    def delete_macro(self, user_id: str, macro_id: int) -> RecordDict:
-        macros = self.macro_table.first(formula=f'{{slack_id}} = "{user_id}"')
-        assert macros
-        macros_list = json.loads(macros["fields"]["data"])
-        
-        return self.macro_table.update(
-            macros["id"],
-            {
-                "version": 1,
-                "data": json.dumps([x for i, x in enumerate(macros_list) if i != macro_id])
-            }
-        )
+    async def get_macros(self, user_id: str) -> List[Macro]:
+        return await self.macros.list(user_id)
+
+    async def get_macro(self, user_id: str, macro_id: str) -> Macro | None:
+        return await self.macros.get(user_id, macro_id)
+
+    async def find_macro(self, user_id: str, name: str) -> Macro | None:
+        return await self.macros.find(user_id, name)
+
+    async def suggest_macros(self, user_id: str, name: str) -> List[Macro]:
+        return await self.macros.suggest(user_id, name)
+
+    def search_macros(self, query: str) -> List[Tuple[str, Macro]]:
+        """Searches the team macro library, returns (owner slack id, macro) pairs"""
+        return self.macros.search(query)
+
+    async def warm_macros(self):
+        await self.macros.warm()
+
+    async def insert_macro(self, user_id: str, macro: Macro) -> RecordDict:
+        return await self.macros.insert(user_id, macro)
+
+    async def delete_macro(self, user_id: str, macro_id: str) -> RecordDict:
+        return await self.macros.delete(user_id, macro_id)
 
-    def get_request(
+    async def get_request(
         self, pub_thread_ts: str | None = None, priv_thread_ts: str | None = None
     ) -> RecordDict | None:
+        req = self.threads.get(pub_thread_ts=pub_thread_ts, priv_thread_ts=priv_thread_ts)
+        if req:
+            return req
+
         if pub_thread_ts:
-            req = self.help_table.first(formula=f'{{identifier}} = "{pub_thread_ts}"')
+            req = self._from_mirror("help", "identifier", pub_thread_ts)
+            req = req or await self.help_table.first(
+                formula=formula.eq("identifier", pub_thread_ts), fields=INDEX_FIELDS
+            )
         elif priv_thread_ts:
-            req = self.help_table.first(
-                formula=f'{{internal_thread}} = "{priv_thread_ts}"'
+            req = self._from_mirror("help", "internal_thread", priv_thread_ts)
+            req = req or await self.help_table.first(
+                formula=formula.eq("internal_thread", priv_thread_ts), fields=INDEX_FIELDS
             )
         else:
             return None
 
+        if req:
+            self.threads.add(req)
+        return req
+
+    async def find_open_requests(self, keyword: str | None = None) -> List[RecordDict]:
+        """Open help requests, if given only those whose content contains `keyword` (case insensitive)"""
+        clauses = [formula.not_(formula.eq("status", "resolved"))]
+        if keyword:
+            clauses.append(formula.contains("content", keyword))
+        return await self.help_table.all(
+            formula=formula.and_(*clauses),
+            fields=INDEX_FIELDS,
+        )
+
+    async def create_request(
+        self, pub_thread_ts: str, content: str, user_id: str, priv_thread_ts: str
+    ) -> RecordDict | None:
+        args = {
+            "pub_thread_ts": pub_thread_ts,
+            "content": content,
+            "user_id": user_id,
+            "priv_thread_ts": priv_thread_ts,
+        }
+        if not self._should_queue():
+            try:
+                return await self._create_request(**args)
+            except AirtableUnavailable as e:
+                print(f"Airtable unavailable, queueing help request: {e}")
+        self.outbox.add("create_request", args)
+
+        # Indexed under a placeholder id so the threads relay until it is written
+        req = {
+            "id": f"{PENDING_PREFIX}{pub_thread_ts}",
+            "createdTime": "",
+            "fields": {"identifier": pub_thread_ts, "internal_thread": priv_thread_ts},
+        }
+        self.threads.add(req)
         return req
 
-    def create_request(
+    async def _replay_create_request(
+        self, pub_thread_ts: str, content: str, user_id: str, priv_thread_ts: str
+    ):
+        # The original request may have reached Airtable before timing out
+        req = await self.help_table.first(
+            formula=formula.eq("identifier", pub_thread_ts), fields=INDEX_FIELDS
+        )
+        if not req:
+            req = await self._create_request(pub_thread_ts, content, user_id, priv_thread_ts)
+        if req and self.threads.remove(f"{PENDING_PREFIX}{pub_thread_ts}"):
+            self.threads.add(req)
+
+    async def _create_request(
         self, pub_thread_ts: str, content: str, user_id: str, priv_thread_ts: str
     ) -> RecordDict | None:
         print(f"Creating help request for user: {user_id}")
-        linked_record = self.get_person(user_id)
+        linked_record = await self.get_person(user_id)
         if not linked_record:
             print("User not found in airtable - HANDLE THIS")
             return None
 
-        res = self.help_table.create(
+        res = await self.help_writes.create(
             {
                 "identifier": pub_thread_ts,
                 "content": content,
@@ -128,47 +286,130 @@ class AirtableManager:
                 "internal_thread": priv_thread_ts,
             }
         )
+        self.threads.add(res)
+        self._mirror_write("help", res)
+        self.people.add_help_request(linked_record)
+        self._mirror_write("people", linked_record)
         return res
 
-    def update_request(
+    async def update_request(
         self,
         pub_thread_ts: str | None = None,
         priv_thread_ts: str | None = None,
         updates: WritableFields = {},
     ) -> RecordDict | None:
-        req = self.get_request(
+        req = await self.get_request(
             pub_thread_ts=pub_thread_ts, priv_thread_ts=priv_thread_ts
         )
         if not req:
             return
-        
-        req = self.help_table.update(req["id"], updates)
+
+        # A request still waiting in the outbox can't be updated until it is written
+        if not self._should_queue() and not req["id"].startswith(PENDING_PREFIX):
+            try:
+                return await self._update_request(req, updates)
+            except AirtableUnavailable as e:
+                print(f"Airtable unavailable, queueing help request update: {e}")
+        self.outbox.add(
+            "update_request",
+            {"pub_thread_ts": pub_thread_ts, "priv_thread_ts": priv_thread_ts, "updates": updates},
+        )
+
+        req = {**req, "fields": {**req["fields"], **updates}}
+        self.threads.add(req)
         return req
 
-    def resolve_request(self, priv_thread_ts: str, resolver: str) -> RecordDict | None:
-        resolver_item = self.get_person(resolver)
+    async def _replay_update_request(
+        self, pub_thread_ts: str | None, priv_thread_ts: str | None, updates: WritableFields
+    ):
+        req = await self.get_request(pub_thread_ts=pub_thread_ts, priv_thread_ts=priv_thread_ts)
+        if not req or req["id"].startswith(PENDING_PREFIX):
+            print(f"Help request {pub_thread_ts or priv_thread_ts} was never created, dropping update")
+            return
+        await self._update_request(req, updates)
+
+    async def _update_request(self, req: RecordDict, updates: WritableFields) -> RecordDict:
+        # Applied to the index straight away so reads see the write while it is batched
+        self.threads.add({**req, "fields": {**req["fields"], **updates}})
+        try:
+            updated = await self.help_writes.update(req["id"], updates)
+        except Exception:
+            self.threads.add(req)
+            raise
+        req = updated
+        self.threads.add(req)
+        self._mirror_write("help", req)
+        return req
+
+    async def resolve_request(self, priv_thread_ts: str, resolver: str) -> RecordDict | None:
+        req = self.threads.get(priv_thread_ts=priv_thread_ts)
+        if not self._should_queue() and not (req and req["id"].startswith(PENDING_PREFIX)):
+            try:
+                return await self._resolve_request(priv_thread_ts, resolver)
+            except AirtableUnavailable as e:
+                print(f"Airtable unavailable, queueing resolution: {e}")
+        self.outbox.add("resolve_request", {"priv_thread_ts": priv_thread_ts, "resolver": resolver})
+
+        if not req:
+            return None
+        self.threads.remove(req["id"])
+        return {**req, "fields": {**req["fields"], "status": "resolved"}}
+
+    async def _resolve_request(self, priv_thread_ts: str, resolver: str) -> RecordDict | None:
+        resolver_item = await self.get_person(resolver)
         if not resolver_item:
             return
         id = resolver_item.get("id")
 
-        req = self.get_request(priv_thread_ts=priv_thread_ts)
+        req = await self.get_request(priv_thread_ts=priv_thread_ts)
         if not req:
             return
-        return self.help_table.update(
-            req["id"], {"resolver": [id], "status": "resolved"}
-        )
+        self.threads.remove(req["id"])
+        try:
+            resolved = await self.help_writes.update(
+                req["id"], {"resolver": [id], "status": "resolved"}
+            )
+        except Exception:
+            # Still open in Airtable, so keep relaying it
+            self.threads.add(req)
+            raise
+        self._mirror_write("help", resolved)
+        return resolved
 
-    def delete_req(self, pub_thread_ts: str) -> RecordDeletedDict | None:
-        req = self.get_request(pub_thread_ts)
+    async def delete_req(self, pub_thread_ts: str) -> RecordDeletedDict | None:
+        req = await self.get_request(pub_thread_ts)
         if not req:
             return
-        req = self.help_table.delete(req["id"])
+        req = await self.help_table.delete(req["id"])
+        self.threads.remove(req["id"])
+        if self.mirror:
+            self.mirror.delete("help", req["id"])
         return req
 
-    def get_fraud_data(self, user_id: str) -> List[RecordDict]:
-        fraud_data = self.fraud_data_table.all(formula=f'{{Slack ID}} = "{user_id}"')
+    async def get_fraud_data_for(self, user_ids: List[str]) -> Dict[str, List[RecordDict]]:
+        """Gets fraud cases for many users in one query, keyed by Slack ID"""
+        fraud_data: Dict[str, List[RecordDict]] = {user_id: [] for user_id in user_ids}
+        for case in await self.fraud_data_table.all(
+            formula=formula.any_eq("Slack ID", user_ids), fields=FRAUD_FIELDS
+        ):
+            fraud_data.setdefault(case["fields"].get("Slack ID"), []).append(case)
+        return fraud_data
+
+    async def get_fraud_data(self, user_id: str) -> List[RecordDict]:
+        fraud_data = await self.fraud_data_table.all(
+            formula=formula.eq("Slack ID", user_id), fields=FRAUD_FIELDS
+        )
         return fraud_data
     
-    def get_hs_user(self, user_id: str) -> RecordDict | None:
-        user = self.hs_people_table.first(formula=f'{{slack_id}} = "{user_id}"')
-        return user
\ No newline at end of file
+    async def get_hs_user(self, user_id: str) -> RecordDict | None:
+        user = await self.hs_people_table.first(
+            formula=formula.eq("slack_id", user_id), fields=HS_USER_FIELDS
+        )
+        return user
+
+    async def get_hs_users(self, user_ids: List[str]) -> Dict[str, RecordDict]:
+        """Gets many High Seas users in one query, keyed by Slack ID"""
+        users = await self.hs_people_table.all(
+            formula=formula.any_eq("slack_id", user_ids), fields=HS_USER_FIELDS
+        )
+        return {user["fields"]["slack_id"]: user for user in users}
@@ -0,0 +1,318 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+from urllib.parse import quote
+
+import aiohttp
+from pyairtable.api.types import RecordDeletedDict, RecordDict, WritableFields
+
+from .breaker import CircuitBreaker
+from .ratelimit import TokenBucket
+
+AIRTABLE_API_URL = "https://api.airtable.com/v0"
+
+# Airtable accepts at most 10 records per create/update request
+BATCH_SIZE = 10
+
+
+class AirtableError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Airtable returned {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class AirtableUnavailable(AirtableError):
+    """Airtable timed out, could not be reached, returned a 5xx, or the circuit is open"""
+
+
+class AsyncApi:
+    """Async Airtable REST client sharing one pooled aiohttp session per base.
+
+    Airtable allows 5 requests per second per base, so every client for the
+    same base shares a single token bucket. `max_concurrency` bounds the
+    number of in-flight requests (and pooled connections).
+
+    Requests go through a circuit breaker. Timeouts, connection errors and
+    5xx responses raise `AirtableUnavailable`, and once the circuit opens
+    requests fail with it immediately instead of waiting on Airtable.
+    """
+
+    _limiters: Dict[str, TokenBucket] = {}
+
+    def __init__(
+        self,
+        api_key: str,
+        base_id: str,
+        max_concurrency: int = 10,
+        requests_per_second: float = 5,
+        base_url: str = AIRTABLE_API_URL,
+        max_retries: int = 3,
+        timeout: float = 10,
+    ):
+        self.api_key = api_key
+        self.base_id = base_id
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._limiter = AsyncApi._limiters.setdefault(
+            base_id, TokenBucket(rate=requests_per_second)
+        )
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency, keepalive_timeout=60
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def table(self, table_name: str, limiter: TokenBucket | None = None) -> "AsyncTable":
+        return AsyncTable(self, table_name, limiter)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json: Dict[str, Any] | None = None,
+        limiter: TokenBucket | None = None,
+    ) -> Dict[str, Any]:
+        """`limiter` further throttles background work to a share of the base's budget"""
+        url = f"{self.base_url}/{self.base_id}/{path}"
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise AirtableUnavailable(503, "Circuit open")
+            if limiter is not None:
+                await limiter.acquire()
+            async with self._semaphore:
+                await self._limiter.acquire()
+                try:
+                    async with self.session.request(method, url, json=json) as resp:
+                        if resp.status >= 500:
+                            raise AirtableUnavailable(resp.status, await resp.text())
+                        self.breaker.record_success()
+                        if resp.status == 429 and attempt < self.max_retries:
+                            # Airtable asks clients to back off for 30 seconds
+                            retry_after = float(resp.headers.get("Retry-After", 30))
+                            self._limiter.pause(retry_after)
+                            print(f"Airtable rate limited, retrying in {retry_after} seconds.")
+                            continue
+                        if resp.status >= 400:
+                            raise AirtableError(resp.status, await resp.text())
+                        return await resp.json()
+                except AirtableUnavailable:
+                    self.breaker.record_failure()
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self.breaker.record_failure()
+                    raise AirtableUnavailable(503, str(e) or type(e).__name__) from e
+        raise AirtableError(429, "Rate limited after retries")
+
+
+class AsyncTable:
+    """Mirrors the subset of `pyairtable.Table` that the bot uses, but async."""
+
+    def __init__(self, api: AsyncApi, table_name: str, limiter: TokenBucket | None = None):
+        self.api = api
+        self.name = table_name
+        self.path = quote(table_name, safe="")
+        self.limiter = limiter
+
+    async def _request(self, method: str, path: str, json: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        return await self.api.request(method, path, json=json, limiter=self.limiter)
+
+    async def iterate(
+        self,
+        formula: str | None = None,
+        fields: List[str] | None = None,
+        max_records: int | None = None,
+        page_size: int = 100,
+    ) -> AsyncIterator[List[RecordDict]]:
+        body: Dict[str, Any] = {"pageSize": page_size}
+        if formula:
+            body["filterByFormula"] = formula
+        if fields:
+            body["fields"] = fields
+        if max_records:
+            body["maxRecords"] = max_records
+            body["pageSize"] = min(page_size, max_records)
+
+        while True:
+            # POST so long formulas don't hit Airtable's URL length limit
+            data = await self._request("POST", f"{self.path}/listRecords", json=body)
+            yield data.get("records", [])
+            if not data.get("offset"):
+                return
+            body["offset"] = data["offset"]
+
+    async def all(self, **options) -> List[RecordDict]:
+        records = []
+        async for page in self.iterate(**options):
+            records.extend(page)
+        return records
+
+    async def first(self, **options) -> RecordDict | None:
+        records = await self.all(**options, max_records=1)
+        return records[0] if records else None
+
+    async def get(self, record_id: str) -> RecordDict | None:
+        try:
+            return await self._request("GET", f"{self.path}/{record_id}")
+        except AirtableError as e:
+            if e.status == 404:
+                return None
+            raise e
+
+    async def create(self, fields: WritableFields) -> RecordDict:
+        return await self._request("POST", self.path, json={"fields": fields})
+
+    async def update(self, record_id: str, fields: WritableFields) -> RecordDict:
+        return await self._request(
+            "PATCH", f"{self.path}/{record_id}", json={"fields": fields}
+        )
+
+    async def delete(self, record_id: str) -> RecordDeletedDict:
+        return await self._request("DELETE", f"{self.path}/{record_id}")
+
+    async def batch_create(self, records: List[WritableFields]) -> List[RecordDict]:
+        data = await self._request(
+            "POST", self.path, json={"records": [{"fields": x} for x in records]}
+        )
+        return data["records"]
+
+    async def batch_update(self, records: List[Dict[str, Any]]) -> List[RecordDict]:
+        """Updates records given as `{"id": ..., "fields": ...}`"""
+        data = await self._request("PATCH", self.path, json={"records": records})
+        return data["records"]
+
+
+class WriteBatcher:
+    """Coalesces writes to one table into batch requests.
+
+    Writes made within `delay` seconds of each other are sent together, in
+    batches of up to 10 records. Updates to the same record are merged into
+    one. Each caller still gets back its own record once the batch is written.
+    """
+
+    def __init__(self, table: AsyncTable, delay: float = 0.1):
+        self.table = table
+        self.delay = delay
+        self.requests = 0
+        self.records = 0
+        self._creates: List[Tuple[WritableFields, asyncio.Future]] = []
+        self._updates: Dict[str, Tuple[Dict[str, Any], List[asyncio.Future]]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def create(self, fields: WritableFields) -> RecordDict:
+        future = asyncio.get_running_loop().create_future()
+        self._creates.append((fields, future))
+        self._schedule(len(self._creates))
+        return await future
+
+    async def update(self, record_id: str, fields: WritableFields) -> RecordDict:
+        future = asyncio.get_running_loop().create_future()
+        if record_id in self._updates:
+            self._updates[record_id][0].update(fields)
+            self._updates[record_id][1].append(future)
+        else:
+            self._updates[record_id] = (dict(fields), [future])
+        self._schedule(len(self._updates))
+        return await future
+
+    def _schedule(self, pending: int):
+        if pending >= BATCH_SIZE:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay, self._start_flush)
+
+    def _start_flush(self):
+        task = asyncio.create_task(self._flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        """Sends the pending writes and waits for those already being sent"""
+        await self._flush()
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        creates, self._creates = self._creates, []
+        updates, self._updates = list(self._updates.items()), {}
+        await asyncio.gather(
+            *(self._flush_creates(creates[i:i + BATCH_SIZE]) for i in range(0, len(creates), BATCH_SIZE)),
+            *(self._flush_updates(updates[i:i + BATCH_SIZE]) for i in range(0, len(updates), BATCH_SIZE)),
+        )
+
+    @staticmethod
+    def _retry_alone(error: Exception, batch: List[Any]) -> bool:
+        # A 4xx for one bad record rejects the whole batch, so the others are
+        # retried one by one and only the bad record fails
+        return (
+            len(batch) > 1
+            and isinstance(error, AirtableError)
+            and not isinstance(error, AirtableUnavailable)
+            and 400 <= error.status < 500
+            and error.status != 429
+        )
+
+    async def _flush_creates(self, batch: List[Tuple[WritableFields, asyncio.Future]]):
+        self.requests += 1
+        self.records += len(batch)
+        try:
+            records = await self.table.batch_create([fields for fields, _ in batch])
+        except Exception as e:
+            if self._retry_alone(e, batch):
+                await asyncio.gather(*(self._flush_creates([x]) for x in batch))
+                return
+            for _, future in batch:
+                _set_exception(future, e)
+            return
+        for (_, future), record in zip(batch, records):
+            _set_result(future, record)
+
+    async def _flush_updates(self, batch: List[Tuple[str, Tuple[Dict[str, Any], List[asyncio.Future]]]]):
+        self.requests += 1
+        self.records += len(batch)
+        try:
+            records = await self.table.batch_update(
+                [{"id": record_id, "fields": fields} for record_id, (fields, _) in batch]
+            )
+        except Exception as e:
+            if self._retry_alone(e, batch):
+                await asyncio.gather(*(self._flush_updates([x]) for x in batch))
+                return
+            for _, (_, futures) in batch:
+                for future in futures:
+                    _set_exception(future, e)
+            return
+        for (_, (_, futures)), record in zip(batch, records):
+            for future in futures:
+                _set_result(future, record)
+
+
+# A caller that was cancelled has already given up on its future
+def _set_result(future: asyncio.Future, result: Any):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, error: Exception):
+    if not future.done():
+        future.set_exception(error)
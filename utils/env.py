@@ -1,4 +1,5 @@
 from .airtable import AirtableManager
+from .airtable_api import AIRTABLE_API_URL
 from dotenv import load_dotenv
 import os
 
@@ -17,10 +18,15 @@ class Environment:
         self.github_token = os.environ.get("GITHUB_TOKEN", "")
         self.airtable_api_key = os.environ.get("AIRTABLE_API_KEY", "")
         self.airtable_base_id = os.environ.get("AIRTABLE_BASE_ID", "")
+        # Point at a stand-in server to run against a local copy of the base
+        self.airtable_api_url = os.environ.get("AIRTABLE_API_URL", AIRTABLE_API_URL)
+        self.airtable_mirror_path = os.environ.get("AIRTABLE_MIRROR_PATH", "airtable_mirror.sqlite3")
+        self.airtable_outbox_path = os.environ.get("AIRTABLE_OUTBOX_PATH", "airtable_outbox.sqlite3")
         self.sentry_dsn = os.environ.get("SENTRY_DSN", "")
         self.environment = os.environ.get("ENVIRONMENT", "development")
 
         self.port = int(os.environ.get("PORT", 3000))
+        self.delete_queue_path = os.environ.get("DELETE_QUEUE_PATH", "delete_queue.sqlite3")
 
         if not self.slack_bot_token:
             raise Exception("SLACK_BOT_TOKEN is not set")
@@ -46,7 +52,11 @@ class Environment:
             raise Exception("SENTRY_DSN is not set")
 
         self.airtable = AirtableManager(
-            api_key=self.airtable_api_key, base_id=self.airtable_base_id
+            api_key=self.airtable_api_key,
+            base_id=self.airtable_base_id,
+            base_url=self.airtable_api_url,
+            mirror_path=self.airtable_mirror_path,
+            outbox_path=self.airtable_outbox_path,
         )
 
 
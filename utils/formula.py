@@ -0,0 +1,49 @@
+"""Builds Airtable formulas with every value escaped.
+
+    formula.and_(formula.eq("status", "open"), formula.contains("content", text))
+"""
+
+from typing import Iterable
+
+
+def field(name: str) -> str:
+    return f"{{{name}}}"
+
+
+def string(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def eq(name: str, value: str) -> str:
+    return f"{field(name)} = {string(value)}"
+
+
+def record_id(value: str) -> str:
+    return f"RECORD_ID() = {string(value)}"
+
+
+def and_(*clauses: str) -> str:
+    return f"AND({', '.join(clauses)})"
+
+
+def or_(*clauses: str) -> str:
+    return f"OR({', '.join(clauses)})"
+
+
+def not_(clause: str) -> str:
+    return f"NOT({clause})"
+
+
+def any_eq(name: str, values: Iterable[str]) -> str:
+    """Matches records whose `name` equals any of `values`"""
+    return or_(*(eq(name, value) for value in values))
+
+
+def contains(name: str, value: str) -> str:
+    """Case insensitive substring match"""
+    return f"FIND({string(value.lower())}, LOWER({field(name)}))"
+
+
+def modified_after(iso_datetime: str) -> str:
+    return f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE({string(iso_datetime)}))"
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import aiohttp
+
+from .cache import MISSING, TTLCache
+from .env import env
+
+GITHUB_API_URL = "https://api.github.com"
+
+# Longest we are willing to wait for a rate limit to reset before giving up
+MAX_RATE_LIMIT_WAIT = 60
+
+
+class GitHubError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"GitHub returned {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class GitHubClient:
+    """Long-lived GitHub client sharing one keep-alive session.
+
+    Requests that hit the primary or secondary rate limit are retried after
+    `Retry-After` or `x-ratelimit-reset`, server and connection errors with
+    exponential backoff. Every failure is raised as `GitHubError`.
+    """
+
+    def __init__(self, token: str, repo: str, max_retries: int = 3):
+        self.token = token
+        self.repo = repo
+        self.max_retries = max_retries
+        self._session: aiohttp.ClientSession | None = None
+        # Open issues by normalized title, so a burst of the same report maps to one issue
+        self.issue_cache: TTLCache[str, Dict[str, Any] | None] = TTLCache(maxsize=512, ttl=5 * 60)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                base_url=GITHUB_API_URL,
+                headers={
+                    "Accept": "application/vnd.github+json",
+                    "Authorization": f"Bearer {self.token}",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                },
+                connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _retry_delay(self, resp: aiohttp.ClientResponse, attempt: int) -> float | None:
+        """Seconds to wait before retrying, or None if the response is final"""
+        if resp.status in (403, 429):
+            if "Retry-After" in resp.headers:
+                return float(resp.headers["Retry-After"])
+            if resp.headers.get("x-ratelimit-remaining") == "0":
+                return max(0, float(resp.headers.get("x-ratelimit-reset", 0)) - time.time())
+            return None
+        if resp.status >= 500:
+            return 2 ** attempt
+        return None
+
+    async def request(self, method: str, path: str, **kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session.request(method, path, **kwargs) as resp:
+                    if resp.status < 400:
+                        return await resp.json()
+
+                    delay = self._retry_delay(resp, attempt)
+                    if delay is None or delay > MAX_RATE_LIMIT_WAIT or attempt == self.max_retries:
+                        raise GitHubError(resp.status, await resp.text())
+                    reason = str(resp.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise GitHubError(0, str(e) or type(e).__name__) from e
+                delay = 2 ** attempt
+                reason = type(e).__name__
+            print(f"GitHub request failed ({reason}), retrying in {delay} seconds.")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _normalize(title: str) -> str:
+        return " ".join(title.lower().split())
+
+    async def find_open_issue(self, title: str) -> Dict[str, Any] | None:
+        """Finds an open issue with the same title, ignoring case and whitespace"""
+        key = self._normalize(title)
+        issue = self.issue_cache.get(key, MISSING)
+        if issue is not MISSING:
+            return issue
+
+        query = f'repo:{self.repo} is:issue is:open in:title "{title.replace('"', "")}"'
+        res = await self.request("GET", "/search/issues", params={"q": query, "per_page": 10})
+        issue = next((x for x in res["items"] if self._normalize(x["title"]) == key), None)
+        self.issue_cache.set(key, issue)
+        return issue
+
+    async def comment_on_issue(self, issue: Dict[str, Any], body: str, labels: List[str]):
+        """Adds a report to an existing issue, along with any labels it is missing"""
+        await self.request(
+            "POST", f"/repos/{self.repo}/issues/{issue['number']}/comments", json={"body": body}
+        )
+        if labels:
+            await self.request(
+                "POST", f"/repos/{self.repo}/issues/{issue['number']}/labels", json={"labels": labels}
+            )
+
+    async def create_issue(self, title: str, body: str, labels: List[str]) -> Dict[str, Any]:
+        issue = await self.request(
+            "POST",
+            f"/repos/{self.repo}/issues",
+            json={"title": title, "body": body, "labels": labels},
+        )
+        self.issue_cache.set(self._normalize(title), issue)
+        return issue
+
+
+github = GitHubClient(env.github_token, env.github_repo)
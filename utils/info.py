@@ -1,8 +1,42 @@
+import asyncio
+from typing import List, Tuple
+
+from pyairtable.api.types import RecordDict
+
+from utils.cache import TTLCache
 from utils.env import env
 
-def get_user_info(user_id: str):
-    hs_user = env.airtable.get_hs_user(user_id) or {}
-    fraud_data = env.airtable.get_fraud_data(user_id) or {}
+# Keyed by Slack ID, holds (hs_people record, fraud_data records)
+info_cache: TTLCache[str, Tuple[RecordDict | None, List[RecordDict]]] = TTLCache(maxsize=1024, ttl=60)
+
+# Keeps the OR() formulas well under Airtable's formula length limit
+PREFETCH_CHUNK_SIZE = 50
+
+
+async def prefetch_user_info(user_ids: List[str]):
+    """Loads user data for many Slack IDs with one OR() query per table"""
+    missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in info_cache]
+    for i in range(0, len(missing), PREFETCH_CHUNK_SIZE):
+        chunk = missing[i:i + PREFETCH_CHUNK_SIZE]
+        hs_users, fraud_data = await asyncio.gather(
+            env.airtable.get_hs_users(chunk),
+            env.airtable.get_fraud_data_for(chunk),
+        )
+        for user_id in chunk:
+            info_cache.set(user_id, (hs_users.get(user_id), fraud_data.get(user_id, [])))
+
+
+async def get_user_info(user_id: str):
+    cached = info_cache.get(user_id)
+    if cached is None:
+        cached = await asyncio.gather(
+            env.airtable.get_hs_user(user_id),
+            env.airtable.get_fraud_data(user_id),
+        )
+        info_cache.set(user_id, tuple(cached))
+
+    hs_user = cached[0] or {}
+    fraud_data = cached[1] or []
     
     stage = hs_user.get("fields", {}).get("stage", "unknown").replace("_", " ").title()
     verification_status = hs_user.get("fields", {}).get("verification_status", ["Not submitted"])[0]
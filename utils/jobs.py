@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Set
+
+from sentry_sdk import capture_exception
+
+from .metrics import current_listener, job_seconds, job_wait_seconds
+
+
+class JobQueue:
+    """Runs handler work in the background after the request has been acked.
+
+    At most `concurrency` jobs run at once. Jobs submitted with the same key
+    (a thread ts) run in submission order, jobs with different keys run in
+    parallel.
+    """
+
+    def __init__(self, concurrency: int = 16):
+        self.concurrency = concurrency
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tails: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._waits: Deque[float] = deque(maxlen=100)
+
+    def submit(self, key: str | None, func: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        previous = self._tails.get(key) if key else None
+        task = asyncio.create_task(self._run(previous, func, time.monotonic()))
+        self.pending += 1
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        if key:
+            self._tails[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return task
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def _run(
+        self, previous: asyncio.Task | None, func: Callable[[], Awaitable[Any]], submitted: float
+    ):
+        if previous:
+            await asyncio.wait([previous])
+
+        async with self._semaphore:
+            self.pending -= 1
+            self.running += 1
+            started = time.monotonic()
+            self._waits.append(started - submitted)
+            # The task copied the context of the listener that submitted it
+            listener = current_listener.get()
+            job_wait_seconds.observe(started - submitted, listener)
+            try:
+                await func()
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Background job failed: {e}")
+                capture_exception(e)
+            finally:
+                self.running -= 1
+                job_seconds.observe(time.monotonic() - started, listener)
+
+    async def drain(self, timeout: float = 10):
+        """Waits for submitted jobs to finish, e.g. on shutdown"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": round(sum(self._waits) / len(self._waits), 3) if self._waits else 0,
+            "max_wait": round(max(self._waits), 3) if self._waits else 0,
+        }
+
+
+jobs = JobQueue()
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Dict, Set
+
+from slack_sdk.web.async_client import AsyncWebClient
+
+LIFEGUARDS_USERGROUP = "S07U41270QN"
+
+NO_PERMISSION_MESSAGE = "You do not have permission to use this command. If you think this is a mistake, please message <@U054VC2KM9P>"
+
+
+class Lifeguards:
+    """Cached members of the lifeguards usergroup.
+
+    Kept current by `subteam_members_changed` events, with a periodic full
+    refresh in case an event is missed.
+    """
+
+    def __init__(self, usergroup: str, refresh_interval: float = 10 * 60):
+        self.usergroup = usergroup
+        self.refresh_interval = refresh_interval
+        self.members: Set[str] = set()
+        self.loaded = False
+        self._task: asyncio.Task | None = None
+
+    async def refresh(self, client: AsyncWebClient):
+        res = await client.usergroups_users_list(usergroup=self.usergroup)
+        self.members = set(res.get("users", []))
+        self.loaded = True
+
+    async def _refresh_loop(self, client: AsyncWebClient):
+        while True:
+            try:
+                await self.refresh(client)
+            except Exception as e:
+                print(f"Failed to refresh lifeguards: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self, client: AsyncWebClient):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop(client))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def apply_change(self, event: Dict[str, Any]):
+        """Applies a `subteam_members_changed` event"""
+        if event.get("subteam_id") != self.usergroup:
+            return
+        self.members |= set(event.get("added_users", []))
+        self.members -= set(event.get("removed_users", []))
+
+    async def contains(self, client: AsyncWebClient, user_id: str) -> bool:
+        if not self.loaded:
+            await self.refresh(client)
+        return user_id in self.members
+
+
+lifeguards = Lifeguards(LIFEGUARDS_USERGROUP)
+
+
+async def is_lifeguard(client: AsyncWebClient, user_id: str) -> bool:
+    return await lifeguards.contains(client, user_id)
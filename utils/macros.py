@@ -0,0 +1,352 @@
+import asyncio
+import dataclasses
+import hashlib
+import json
+import re
+import uuid
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+from pyairtable.api.types import RecordDict
+
+from . import formula
+from .airtable_api import AsyncTable
+from .cache import TTLCache
+
+# Version 1 blobs are lists of macros without ids, version 2 adds stable ids
+MACRO_FORMAT_VERSION = 2
+
+MACRO_FIELDS = ["slack_id", "version", "data"]
+
+
+def new_macro_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@dataclasses.dataclass
+class Macro:
+    name: str
+    message: Dict[str, Any]
+    close: bool
+    id: str = dataclasses.field(default_factory=new_macro_id)
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def trigrams(name: str) -> Set[str]:
+    # Per word, so a typo in one word of a multi-word name still shares its neighbours' grams
+    grams: Set[str] = set()
+    for word in name.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class MacroIndex:
+    """Exact lookup by normalized name plus a trigram index for typo-tolerant suggestions"""
+
+    def __init__(self, macros: List[Macro] | None = None):
+        self._by_name: Dict[str, List[Macro]] = {}
+        # Trigram -> names containing it, and each name's own trigrams
+        self._grams: Dict[str, Set[str]] = {}
+        self._name_grams: Dict[str, Set[str]] = {}
+        for macro in macros or []:
+            self.add(macro)
+
+    def add(self, macro: Macro):
+        name = normalize_name(macro.name)
+        if name not in self._by_name:
+            self._by_name[name] = []
+            self._name_grams[name] = trigrams(name)
+            for gram in self._name_grams[name]:
+                self._grams.setdefault(gram, set()).add(name)
+        self._by_name[name].append(macro)
+
+    def remove(self, macro: Macro):
+        name = normalize_name(macro.name)
+        macros = [x for x in self._by_name.get(name, []) if x.id != macro.id]
+        if macros:
+            self._by_name[name] = macros
+            return
+
+        self._by_name.pop(name, None)
+        for gram in self._name_grams.pop(name, set()):
+            names = self._grams.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._grams[gram]
+
+    def find(self, name: str) -> Macro | None:
+        macros = self._by_name.get(normalize_name(name))
+        return macros[0] if macros else None
+
+    def suggest(self, name: str, limit: int = 3, threshold: float = 0.5) -> List[Macro]:
+        query = trigrams(normalize_name(name))
+        if not query:
+            return []
+        shared: Counter[str] = Counter()
+        for gram in query:
+            shared.update(self._grams.get(gram, ()))
+
+        scored = []
+        for candidate, count in shared.items():
+            # Share of the query covered by the name, so a one-word query can
+            # match a longer name. Ties go to the closer name overall (Jaccard).
+            coverage = count / len(query)
+            jaccard = count / (len(query) + len(self._name_grams[candidate]) - count)
+            if coverage >= threshold:
+                scored.append((coverage, jaccard, candidate))
+        scored.sort(reverse=True)
+        return [self._by_name[candidate][0] for _, _, candidate in scored[:limit]]
+
+
+def message_text(block: Any) -> str:
+    """Plain text of a rich text block, for searching"""
+    if isinstance(block, dict):
+        text = block.get("text") if isinstance(block.get("text"), str) else ""
+        return " ".join(filter(None, [text, *(message_text(v) for v in block.values())]))
+    if isinstance(block, list):
+        return " ".join(filter(None, (message_text(x) for x in block)))
+    return ""
+
+
+def tokenize(text: str) -> Set[str]:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class MacroLibrary:
+    """Inverted index over every lifeguard's macros, by name and message text.
+
+    Entries are keyed by (owner slack id, macro id).
+    """
+
+    def __init__(self):
+        self._macros: Dict[Tuple[str, str], Macro] = {}
+        self._owned: Dict[str, Set[Tuple[str, str]]] = {}
+        self._name_postings: Dict[str, Set[Tuple[str, str]]] = {}
+        self._text_postings: Dict[str, Set[Tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._macros)
+
+    def replace_owner(self, owner: str, macros: List[Macro]):
+        """Swaps in the current macro list of one lifeguard"""
+        for key in self._owned.pop(owner, set()):
+            self._remove(key)
+        for macro in macros:
+            self._add(owner, macro)
+
+    def _add(self, owner: str, macro: Macro):
+        key = (owner, macro.id)
+        self._macros[key] = macro
+        self._owned.setdefault(owner, set()).add(key)
+        for token in tokenize(macro.name):
+            self._name_postings.setdefault(token, set()).add(key)
+        for token in tokenize(message_text(macro.message)):
+            self._text_postings.setdefault(token, set()).add(key)
+
+    def _remove(self, key: Tuple[str, str]):
+        macro = self._macros.pop(key, None)
+        if macro is None:
+            return
+        for postings, text in (
+            (self._name_postings, macro.name),
+            (self._text_postings, message_text(macro.message)),
+        ):
+            for token in tokenize(text):
+                keys = postings.get(token)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del postings[token]
+
+    def _matching(self, postings: Dict[str, Set[Tuple[str, str]]], token: str, prefix: bool) -> Set[Tuple[str, str]]:
+        if not prefix:
+            return postings.get(token, set())
+        # The last query token is still being typed, so match it as a prefix
+        matches: Set[Tuple[str, str]] = set()
+        for candidate, keys in postings.items():
+            if candidate.startswith(token):
+                matches |= keys
+        return matches
+
+    def search(self, query: str, limit: int = 25) -> List[Tuple[str, Macro]]:
+        """Macros matching every query word, name matches ranked first"""
+        tokens = re.findall(r"[a-z0-9]+", query.lower())
+        if not tokens:
+            return []
+
+        scores: Counter[Tuple[str, str]] | None = None
+        for i, token in enumerate(tokens):
+            prefix = i == len(tokens) - 1
+            in_name = self._matching(self._name_postings, token, prefix)
+            in_text = self._matching(self._text_postings, token, prefix)
+            token_scores = Counter({key: 1 for key in in_text})
+            token_scores.update({key: 2 for key in in_name})
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = Counter({key: scores[key] + n for key, n in token_scores.items() if key in scores})
+
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], self._macros[x[0]].name.lower()))
+        return [(owner, self._macros[(owner, macro_id)]) for (owner, macro_id), _ in ranked[:limit]]
+
+
+@dataclasses.dataclass
+class UserMacros:
+    record_id: str | None
+    # The `data` blob as last read or written, used to detect concurrent edits
+    raw: str | None
+    macros: List[Macro]
+    index: MacroIndex
+
+
+def derived_id(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def parse_macros(raw: str) -> List[Macro]:
+    # Missing and duplicate ids are derived from the blob, so every parse of it
+    # agrees on them until it is rewritten
+    macros = []
+    seen = set()
+    for position, x in enumerate(json.loads(raw)):
+        if "id" not in x:
+            x = {**x, "id": derived_id(x)}
+        attempt = 0
+        while x["id"] in seen:
+            x = {**x, "id": derived_id([x, position, attempt])}
+            attempt += 1
+        seen.add(x["id"])
+        macros.append(Macro(**x))
+    return macros
+
+
+class MacroStore:
+    """Per-user macro lists with a write-through cache.
+
+    Reads are served from memory, and every user's macros are also indexed
+    in a shared team library for searching. Airtable has no conditional writes, so an
+    edit re-reads the user's blob and is applied to that latest version
+    rather than to the cached copy. Edits address macros by id, so a macro
+    added or removed elsewhere in the meantime is kept as is.
+    """
+
+    def __init__(
+        self,
+        table: AsyncTable,
+        get_person: Callable[[str], Awaitable[RecordDict | None]],
+    ):
+        self.table = table
+        self.get_person = get_person
+        self._cache: TTLCache[str, UserMacros] = TTLCache(maxsize=512, ttl=10 * 60)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.library = MacroLibrary()
+
+    def _entry(self, record: RecordDict) -> UserMacros:
+        assert record["fields"]["version"] in (1, MACRO_FORMAT_VERSION)
+        raw = record["fields"]["data"]
+        macros = parse_macros(raw)
+        return UserMacros(record["id"], raw, macros, MacroIndex(macros))
+
+    async def warm(self):
+        """Loads every lifeguard's macros into the cache and the team library"""
+        async for page in self.table.iterate(fields=MACRO_FIELDS):
+            for record in page:
+                user_id = record["fields"].get("slack_id")
+                if not user_id or "data" not in record["fields"]:
+                    continue
+                entry = self._entry(record)
+                self._cache.set(user_id, entry)
+                self.library.replace_owner(user_id, entry.macros)
+        print(f"Indexed {len(self.library)} macros")
+
+    def search(self, query: str, limit: int = 25) -> List[Tuple[str, Macro]]:
+        """Searches every lifeguard's macros, returns (owner slack id, macro) pairs"""
+        return self.library.search(query, limit)
+
+    async def _fetch(self, user_id: str) -> UserMacros:
+        record = await self.table.first(formula=formula.eq("slack_id", user_id), fields=MACRO_FIELDS)
+        cached = self._cache.get(user_id)
+        if record is None:
+            entry = UserMacros(None, None, [], MacroIndex())
+        elif cached and cached.record_id == record["id"] and cached.raw == record["fields"]["data"]:
+            entry = cached
+        else:
+            entry = self._entry(record)
+        self._cache.set(user_id, entry)
+        if entry is not cached:
+            self.library.replace_owner(user_id, entry.macros)
+        return entry
+
+    async def _get(self, user_id: str) -> UserMacros:
+        return self._cache.get(user_id) or await self._fetch(user_id)
+
+    async def list(self, user_id: str) -> List[Macro]:
+        return (await self._get(user_id)).macros
+
+    async def get(self, user_id: str, macro_id: str) -> Macro | None:
+        return next((x for x in await self.list(user_id) if x.id == macro_id), None)
+
+    async def find(self, user_id: str, name: str) -> Macro | None:
+        """Finds a macro by name, ignoring case and extra whitespace"""
+        return (await self._get(user_id)).index.find(name)
+
+    async def suggest(self, user_id: str, name: str) -> List[Macro]:
+        """Macros with names similar to `name`, best match first"""
+        return (await self._get(user_id)).index.suggest(name)
+
+    async def insert(self, user_id: str, macro: Macro) -> RecordDict:
+        return await self._update(user_id, lambda macros: [*macros, macro])
+
+    async def delete(self, user_id: str, macro_id: str) -> RecordDict:
+        return await self._update(
+            user_id, lambda macros: [x for x in macros if x.id != macro_id]
+        )
+
+    async def _update(
+        self, user_id: str, change: Callable[[List[Macro]], List[Macro]]
+    ) -> RecordDict:
+        async with self._locks.setdefault(user_id, asyncio.Lock()):
+            cached = self._cache.get(user_id)
+            current = await self._fetch(user_id)
+            if cached and cached.raw != current.raw:
+                print(f"Macros for {user_id} changed since they were cached, applying edit to the latest version")
+            return await self._write(user_id, current, change(current.macros))
+
+    async def _write(self, user_id: str, current: UserMacros, macros: List[Macro]) -> RecordDict:
+        raw = json.dumps([dataclasses.asdict(x) for x in macros])
+        if current.record_id is None:
+            person = await self.get_person(user_id)
+            assert person
+
+            record = await self.table.create(
+                {
+                    "slack_id": user_id,
+                    "version": MACRO_FORMAT_VERSION,
+                    "data": raw,
+                    "person": [person["id"]],
+                }
+            )
+        else:
+            record = await self.table.update(
+                current.record_id, {"version": MACRO_FORMAT_VERSION, "data": raw}
+            )
+
+        # Update the index in place rather than rebuilding it
+        index = current.index
+        old_ids = {x.id for x in current.macros}
+        new_ids = {x.id for x in macros}
+        for macro in current.macros:
+            if macro.id not in new_ids:
+                index.remove(macro)
+        for macro in macros:
+            if macro.id not in old_ids:
+                index.add(macro)
+
+        self._cache.set(user_id, UserMacros(record["id"], raw, macros, index))
+        self.library.replace_owner(user_id, macros)
+        return record
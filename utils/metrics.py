@@ -0,0 +1,259 @@
+import contextvars
+import functools
+import inspect
+import time
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+from slack_sdk.web.async_client import AsyncWebClient
+
+# Seconds, from a cached lookup to a slow Airtable round trip
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Name of the Bolt listener handling the current request. Tasks copy it when
+# created, so background jobs submitted by a listener are attributed to it.
+current_listener: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_listener", default="none"
+)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: per-bucket counts (not cumulative), sum and count
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        counts, totals = self._values.setdefault(labels, ([0] * len(self.buckets), [0.0, 0]))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        totals[0] += value
+        totals[1] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, (total, count)) in self._values.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {int(count)}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {int(count)}"
+
+
+class Gauge:
+    """Metric read when scraped. `collect` returns the value for each label set.
+
+    `kind` can be "counter" for totals that something else already keeps.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str],
+        collect: Callable[[], Dict[Labels, float]],
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in self.collect().items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = ()) -> Histogram:
+        return self.register(Histogram(name, help, labels))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str],
+        collect: Callable[[], Dict[Labels, float]],
+        kind: str = "gauge",
+    ) -> Gauge:
+        return self.register(Gauge(name, help, labels, collect, kind))
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+listener_seconds = registry.histogram(
+    "boatswain_listener_seconds", "Time for a Bolt listener to return (the ack path)", ["listener"]
+)
+job_seconds = registry.histogram(
+    "boatswain_job_seconds", "Time to run a background job, by the listener that submitted it", ["listener"]
+)
+job_wait_seconds = registry.histogram(
+    "boatswain_job_wait_seconds", "Time a background job waited before it started", ["listener"]
+)
+slack_seconds = registry.histogram(
+    "boatswain_slack_api_seconds", "Slack Web API call latency, including retries", ["method"]
+)
+slack_errors = registry.counter(
+    "boatswain_slack_api_errors_total", "Slack Web API calls that raised", ["method"]
+)
+airtable_seconds = registry.histogram(
+    "boatswain_airtable_seconds", "AirtableManager method latency", ["method"]
+)
+airtable_errors = registry.counter(
+    "boatswain_airtable_errors_total", "AirtableManager method calls that raised", ["method"]
+)
+
+
+def listener_name(body: Dict[str, Any]) -> str:
+    """Label for the Bolt listener a request body is routed to"""
+    if "event" in body:
+        return f"event:{body['event'].get('type')}"
+    match body.get("type"):
+        case "block_actions":
+            return f"action:{body['actions'][0].get('action_id')}"
+        case "block_suggestion":
+            return f"options:{body.get('action_id')}"
+        case "view_submission" | "view_closed":
+            return f"view:{body['view'].get('callback_id')}"
+    if "command" in body:
+        return f"command:{body['command']}"
+    return body.get("type") or "unknown"
+
+
+def measure_listener(func):
+    """Decorator for Bolt listeners recording how long they take to return.
+
+    Global middleware can't time listeners, as its `next()` returns before
+    they run. Background jobs the listener submits are attributed to it.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(**kwargs):
+        name = listener_name(kwargs.get("body", {}))
+        current_listener.set(name)
+        start = time.perf_counter()
+        try:
+            return await func(**kwargs)
+        finally:
+            listener_seconds.observe(time.perf_counter() - start, name)
+
+    return wrapper
+
+
+def measure_methods(histogram: Histogram, errors: Counter):
+    """Class decorator recording latency and errors of every public async method"""
+
+    def measure(name: str, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                errors.inc(name)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, name)
+
+        return wrapper
+
+    def decorate(cls):
+        for name, func in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.iscoroutinefunction(func):
+                setattr(cls, name, measure(name, func))
+        return cls
+
+    return decorate
+
+
+class MeteredWebClient(AsyncWebClient):
+    """AsyncWebClient recording the latency and errors of every API method"""
+
+    @classmethod
+    def copy_of(cls, client: AsyncWebClient) -> "MeteredWebClient":
+        """Metered client with the same settings, e.g. for the one Bolt creates per request"""
+        metered = cls(
+            token=client.token,
+            base_url=client.base_url,
+            timeout=client.timeout,
+            ssl=client.ssl,
+            proxy=client.proxy,
+            session=client.session,
+            trust_env_in_session=client.trust_env_in_session,
+            headers=dict(client.headers),
+            retry_handlers=client.retry_handlers,
+        )
+        metered.default_params = dict(client.default_params)
+        return metered
+
+    async def api_call(self, api_method: str, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().api_call(api_method, *args, **kwargs)
+        except Exception:
+            slack_errors.inc(api_method)
+            raise
+        finally:
+            slack_seconds.observe(time.perf_counter() - start, api_method)
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Set, Tuple
+
+from pyairtable.api.types import RecordDict
+
+from . import formula
+from .airtable_api import AsyncApi
+from .people import HELP_REQUEST_COUNT_FIELD, PERSON_FIELDS
+from .ratelimit import TokenBucket
+from .thread_index import INDEX_FIELDS
+
+# Fields mirrored for each table, and the (at most two) fields records are looked up by.
+# hs_people isn't mirrored: nearly all of its fields are computed, so it is read
+# live behind the user info cache (utils/info.py).
+MIRRORED_TABLES: Dict[str, Tuple[List[str], List[str]]] = {
+    "help": (INDEX_FIELDS, ["identifier", "internal_thread"]),
+    "people": (PERSON_FIELDS, ["slack_id"]),
+}
+
+# Airtable doesn't move LAST_MODIFIED_TIME() when a computed field (count,
+# rollup, lookup, formula) changes, so polling misses those changes. Tables
+# mirroring one are fully resynced on a shorter interval instead.
+COMPUTED_FIELDS: Dict[str, List[str]] = {
+    "people": [HELP_REQUEST_COUNT_FIELD],
+}
+
+
+# Share of the base's 5 requests per second that syncs may use, so a full
+# resync doesn't hold up reads and writes on the hot path
+SYNC_REQUESTS_PER_SECOND = 1
+
+
+def airtable_datetime(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class AirtableMirror:
+    """Local SQLite copy of the tables read on the hot path.
+
+    Each table is polled for rows whose LAST_MODIFIED_TIME() is after the
+    previous poll, fetching only the mirrored fields. A full resync every
+    few hours drops rows that were deleted in Airtable, and one every few
+    minutes picks up computed fields in tables that have them. Writes still go to
+    Airtable, and their results are upserted here so reads see them straight
+    away. The mirror survives restarts, so a table synced in a previous run
+    is served immediately while it catches up.
+    """
+
+    def __init__(
+        self,
+        api: AsyncApi,
+        path: str,
+        poll_interval: float = 30,
+        resync_interval: float = 6 * 60 * 60,
+        computed_resync_interval: float = 10 * 60,
+        # Re-fetches rows modified slightly before the watermark, to cover clock skew
+        overlap: float = 60,
+    ):
+        limiter = TokenBucket(rate=SYNC_REQUESTS_PER_SECOND)
+        self.tables = {name: api.table(name, limiter) for name in MIRRORED_TABLES}
+        self.path = path
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self.computed_resync_interval = computed_resync_interval
+        self.overlap = overlap
+        self.ready: Set[str] = set()
+        self.rows_synced = 0
+        self._db: sqlite3.Connection | None = None
+        self._task: asyncio.Task | None = None
+
+    def open(self):
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS records (
+                table_name TEXT NOT NULL,
+                id TEXT NOT NULL,
+                key1 TEXT,
+                key2 TEXT,
+                fields TEXT NOT NULL,
+                PRIMARY KEY (table_name, id)
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_key1 ON records (table_name, key1)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_key2 ON records (table_name, key2)")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS watermarks (
+                table_name TEXT PRIMARY KEY,
+                synced_at REAL NOT NULL,
+                full_synced_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS mirrored_fields (
+                table_name TEXT PRIMARY KEY,
+                fields TEXT NOT NULL
+            )"""
+        )
+        stored = dict(self._db.execute("SELECT table_name, fields FROM mirrored_fields"))
+        with self._db:
+            for name in stored.keys() - MIRRORED_TABLES.keys():
+                # No longer mirrored
+                for table in ("records", "watermarks", "mirrored_fields"):
+                    self._db.execute(f"DELETE FROM {table} WHERE table_name = ?", (name,))
+            for name, (fields, _) in MIRRORED_TABLES.items():
+                if stored.get(name) == json.dumps(fields):
+                    continue
+                # The mirrored fields changed, so the table is synced again from scratch
+                self._db.execute("DELETE FROM records WHERE table_name = ?", (name,))
+                self._db.execute("DELETE FROM watermarks WHERE table_name = ?", (name,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO mirrored_fields (table_name, fields) VALUES (?, ?)",
+                    (name, json.dumps(fields)),
+                )
+        self.ready = {
+            name for (name,) in self._db.execute("SELECT table_name FROM watermarks")
+        } & set(MIRRORED_TABLES)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def start(self):
+        if self._db is None:
+            self.open()
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.close()
+
+    async def _poll_loop(self):
+        while True:
+            for name in MIRRORED_TABLES:
+                try:
+                    await self.sync(name)
+                except Exception as e:
+                    print(f"Failed to sync {name} mirror: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def _watermark(self, name: str) -> Tuple[float, float] | None:
+        assert self._db
+        return self._db.execute(
+            "SELECT synced_at, full_synced_at FROM watermarks WHERE table_name = ?", (name,)
+        ).fetchone()
+
+    async def sync(self, name: str, full: bool = False):
+        """Fetches rows of `name` changed since the last sync, or every row if `full`"""
+        assert self._db
+        started = time.time()
+        watermark = self._watermark(name)
+        resync_interval = self.computed_resync_interval if name in COMPUTED_FIELDS else self.resync_interval
+        full = full or watermark is None or started - watermark[1] > resync_interval
+
+        since = None
+        if not full:
+            since = formula.modified_after(airtable_datetime(watermark[0] - self.overlap))
+
+        fields, _ = MIRRORED_TABLES[name]
+        seen: Set[str] = set()
+        async for page in self.tables[name].iterate(formula=since, fields=fields):
+            self.upsert_many(name, page)
+            seen.update(record["id"] for record in page)
+
+        with self._db:
+            if full:
+                stale = [
+                    (name, record_id)
+                    for (record_id,) in self._db.execute(
+                        "SELECT id FROM records WHERE table_name = ?", (name,)
+                    )
+                    if record_id not in seen
+                ]
+                self._db.executemany("DELETE FROM records WHERE table_name = ? AND id = ?", stale)
+            self._db.execute(
+                """INSERT INTO watermarks (table_name, synced_at, full_synced_at) VALUES (?, ?, ?)
+                ON CONFLICT (table_name) DO UPDATE SET
+                    synced_at = excluded.synced_at,
+                    full_synced_at = CASE WHEN ? THEN excluded.full_synced_at ELSE full_synced_at END""",
+                (name, started, started, full),
+            )
+        self.ready.add(name)
+
+    def upsert_many(self, name: str, records: List[RecordDict]):
+        if self._db is None or not records:
+            return
+        fields, keys = MIRRORED_TABLES[name]
+        rows = []
+        for record in records:
+            projected = {k: v for k, v in record["fields"].items() if k in fields}
+            key_values = [projected.get(key) for key in keys] + [None] * (2 - len(keys))
+            rows.append((name, record["id"], *key_values, json.dumps(projected)))
+        self.rows_synced += len(rows)
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO records (table_name, id, key1, key2, fields) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def upsert(self, name: str, record: RecordDict):
+        self.upsert_many(name, [record])
+
+    def delete(self, name: str, record_id: str):
+        if self._db is None:
+            return
+        with self._db:
+            self._db.execute(
+                "DELETE FROM records WHERE table_name = ? AND id = ?", (name, record_id)
+            )
+
+    def get(self, name: str, field: str, value: str) -> RecordDict | None:
+        """Looks up a record by one of its key fields. Only call once `name` is ready."""
+        if self._db is None:
+            return None
+        column = f"key{MIRRORED_TABLES[name][1].index(field) + 1}"
+        row = self._db.execute(
+            f"SELECT id, fields FROM records WHERE table_name = ? AND {column} = ? LIMIT 1",
+            (name, value),
+        ).fetchone()
+        return {"id": row[0], "createdTime": "", "fields": json.loads(row[1])} if row else None
+
+    def get_by_id(self, name: str, record_id: str) -> RecordDict | None:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT fields FROM records WHERE table_name = ? AND id = ?", (name, record_id)
+        ).fetchone()
+        return {"id": record_id, "createdTime": "", "fields": json.loads(row[0])} if row else None
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+
+from .airtable_api import AirtableError, AirtableUnavailable
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+class Outbox:
+    """SQLite queue of Airtable writes made while Airtable was unavailable.
+
+    Each entry is an operation name and its keyword arguments. Entries are
+    replayed in order every `replay_interval` seconds, and replay stops at
+    the first entry that finds Airtable still unavailable or rate limiting.
+    Entries failing for any other reason are dropped so they cannot block
+    the queue.
+    """
+
+    def __init__(self, path: str, replay_interval: float = 15):
+        self.path = path
+        self.replay_interval = replay_interval
+        self.replayed = 0
+        self.dropped = 0
+        self._db: sqlite3.Connection | None = None
+        self._pending: Deque[Tuple[int, str, Dict[str, Any]]] = deque()
+        self._handlers: Dict[str, Handler] = {}
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def open(self):
+        if self._db is not None:
+            return
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                args TEXT NOT NULL,
+                queued_at REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+        self._pending.extend(
+            (row_id, op, json.loads(args))
+            for row_id, op, args in self._db.execute("SELECT id, op, args FROM outbox ORDER BY id")
+        )
+        if self._pending:
+            print(f"Replaying {len(self._pending)} queued Airtable writes")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def add(self, op: str, args: Dict[str, Any]):
+        self.open()
+        assert self._db
+        # Committed straight away, these are rare and must survive a crash
+        with self._db:
+            cur = self._db.execute(
+                "INSERT INTO outbox (op, args, queued_at) VALUES (?, ?, ?)",
+                (op, json.dumps(args), time.time()),
+            )
+        self._pending.append((cur.lastrowid, op, args))
+
+    def _remove(self, row_id: int):
+        assert self._db
+        with self._db:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        # A recovering Airtable often rate limits the backlog, so that is retried too
+        return isinstance(error, AirtableUnavailable) or (
+            isinstance(error, AirtableError) and error.status == 429
+        )
+
+    async def replay(self):
+        while self._pending:
+            row_id, op, args = self._pending[0]
+            try:
+                await self._handlers[op](**args)
+                self.replayed += 1
+            except Exception as e:
+                if self._retryable(e):
+                    return
+                self.dropped += 1
+                print(f"Dropping queued Airtable {op}: {e}")
+            self._remove(row_id)
+            self._pending.popleft()
+
+    async def _replay_loop(self):
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            try:
+                await self.replay()
+            except Exception as e:
+                print(f"Failed to replay Airtable outbox: {e}")
+
+    def start(self, handlers: Dict[str, Handler]):
+        self._handlers = handlers
+        self.open()
+        if self._task is None:
+            self._task = asyncio.create_task(self._replay_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"depth": len(self._pending), "replayed": self.replayed, "dropped": self.dropped}
@@ -0,0 +1,64 @@
+from pyairtable.api.types import RecordDict
+
+from .cache import MISSING, TTLCache
+
+# Count field over the linked `help_requests`, so lookups don't download the links
+HELP_REQUEST_COUNT_FIELD = "help_request_count"
+
+# Fields read from `people`, `hs_people` and `fraud_data`. Lookups fetch only these.
+PERSON_FIELDS = ["slack_id", HELP_REQUEST_COUNT_FIELD]
+HS_USER_FIELDS = [
+    "slack_id",
+    "stage",
+    "verification_status",
+    "doubloons_paid",
+    "doubloons_spent",
+    "doubloons_balance",
+    "doubloons_granted",
+    "unique_vote_count",
+    "vote_count",
+    "total_ships",
+    "has_ordered_free_stickers",
+    "waka_total_hours_logged",
+    "disciplinary_status",
+]
+FRAUD_FIELDS = ["Slack ID", "Status"]
+
+
+class PeopleDirectory:
+    """Cache of `people` records, keyed by both Slack ID and Airtable record ID.
+
+    Lookups that found nothing are cached too, for a shorter time, so a new
+    user doesn't cost a query per event until their record is created.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 30 * 60, negative_ttl: float = 60):
+        self.negative_ttl = negative_ttl
+        self.by_slack_id: TTLCache[str, RecordDict | None] = TTLCache(maxsize, ttl)
+        self.by_id: TTLCache[str, RecordDict | None] = TTLCache(maxsize, ttl)
+
+    def get(self, slack_id: str):
+        """Returns the cached record, `None` if cached as not found, or `MISSING`"""
+        return self.by_slack_id.get(slack_id, MISSING)
+
+    def get_by_id(self, record_id: str):
+        return self.by_id.get(record_id, MISSING)
+
+    def add(self, record: RecordDict):
+        self.by_id.set(record["id"], record)
+        if slack_id := record["fields"].get("slack_id"):
+            self.by_slack_id.set(slack_id, record)
+
+    def add_missing(self, slack_id: str):
+        self.by_slack_id.set(slack_id, None, ttl=self.negative_ttl)
+
+    def add_missing_id(self, record_id: str):
+        self.by_id.set(record_id, None, ttl=self.negative_ttl)
+
+    def add_help_request(self, record: RecordDict):
+        """Counts a newly created help request on the cached person"""
+        record["fields"][HELP_REQUEST_COUNT_FIELD] = help_request_count(record) + 1
+
+
+def help_request_count(record: RecordDict) -> int:
+    return record["fields"].get(HELP_REQUEST_COUNT_FIELD, 0)
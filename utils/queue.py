@@ -1,30 +1,228 @@
-from time import sleep
-from queue import Queue
-from slack_sdk import WebClient
+import asyncio
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Set, Tuple
+
 from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
 from .env import env
+from .metrics import MeteredWebClient
+from .ratelimit import TokenBucket
+
+# chat.delete is a Tier 3 method (50+ per minute) and tolerates short bursts
+CHAT_DELETE_RATE = 50 / 60
+CHAT_DELETE_BURST = 20
+
+# Journal writes queued within this window are committed in one transaction
+JOURNAL_FLUSH_DELAY = 0.05
+
+
+class DeleteJournal:
+    """SQLite journal of pending deletions so they survive a restart or crash.
+
+    Writes are buffered and committed together shortly after, so enqueueing a
+    whole thread costs a single transaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+        self._inserts: Dict[Tuple[str, str], float] = {}
+        self._removes: Set[Tuple[str, str]] = set()
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    def open(self) -> List[Tuple[str, str]]:
+        """Opens the journal and returns the deletions left over from the last run"""
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS pending_deletes (
+                channel TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                queued_at REAL NOT NULL,
+                PRIMARY KEY (channel, ts)
+            )"""
+        )
+        self._db.commit()
+        return self._db.execute(
+            "SELECT channel, ts FROM pending_deletes ORDER BY queued_at"
+        ).fetchall()
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def add(self, channel_id: str, message_ts: str):
+        key = (channel_id, message_ts)
+        self._removes.discard(key)
+        self._inserts[key] = time.time()
+        self._schedule_flush()
+
+    def remove(self, channel_id: str, message_ts: str):
+        key = (channel_id, message_ts)
+        if self._inserts.pop(key, None) is None:
+            self._removes.add(key)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                JOURNAL_FLUSH_DELAY, self.flush
+            )
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._db is None or not (self._inserts or self._removes):
+            return
+
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO pending_deletes (channel, ts, queued_at) VALUES (?, ?, ?)",
+                [(channel, ts, queued_at) for (channel, ts), queued_at in self._inserts.items()],
+            )
+            self._db.executemany(
+                "DELETE FROM pending_deletes WHERE channel = ? AND ts = ?",
+                list(self._removes),
+            )
+        self._inserts.clear()
+        self._removes.clear()
 
-client = WebClient(token=env.slack_user_token)
 
-delete_queue = Queue()
+class DeleteScheduler:
+    """Deletes messages from the app's event loop with a few concurrent workers.
 
+    Every Slack method gets its own token bucket. A `ratelimited` error pauses
+    only that method's bucket for `Retry-After` seconds and re-queues the
+    message, so the other workers keep going once the pause is over.
 
-def process_queue():
-    while True:
-        channel_id, message_ts = delete_queue.get()
+    Pending messages are journaled and replayed on start. A `(channel, ts)`
+    that is already queued is not queued again.
+    """
+
+    def __init__(
+        self,
+        client: AsyncWebClient,
+        journal: DeleteJournal,
+        concurrency: int = 4,
+        max_retries: int = 5,
+    ):
+        self.client = client
+        self.journal = journal
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.queue: asyncio.Queue[Tuple[str, str, int]] = asyncio.Queue()
+        self.limiters: Dict[str, TokenBucket] = {
+            "chat.delete": TokenBucket(rate=CHAT_DELETE_RATE, capacity=CHAT_DELETE_BURST)
+        }
+        self.in_flight = 0
+        self.deleted = 0
+        self.failed = 0
+        self.retries = 0
+        self._drained: Deque[float] = deque(maxlen=1000)
+        self._workers: List[asyncio.Task] = []
+        self._queued: Set[Tuple[str, str]] = set()
+
+    def start(self):
+        if self._workers:
+            return
+        pending = self.journal.open()
+        for channel_id, message_ts in pending:
+            self._enqueue(channel_id, message_ts)
+        if pending:
+            print(f"Replaying {len(pending)} pending deletions")
+
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.journal.close()
+
+    def add(self, channel_id: str, message_ts: str):
+        if (channel_id, message_ts) in self._queued:
+            return
+        self.journal.add(channel_id, message_ts)
+        self._enqueue(channel_id, message_ts)
+
+    def _enqueue(self, channel_id: str, message_ts: str, attempt: int = 0):
+        self._queued.add((channel_id, message_ts))
+        self.queue.put_nowait((channel_id, message_ts, attempt))
+
+    def _done(self, channel_id: str, message_ts: str):
+        self._queued.discard((channel_id, message_ts))
+        self.journal.remove(channel_id, message_ts)
+
+    def drain_rate(self, window: float = 60) -> float:
+        """Messages deleted per second over the last `window` seconds"""
+        since = time.monotonic() - window
+        return sum(1 for t in self._drained if t >= since) / window
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.queue.qsize(),
+            "in_flight": self.in_flight,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "retries": self.retries,
+            "drain_rate": round(self.drain_rate(), 3),
+        }
+
+    async def _worker(self):
+        while True:
+            channel_id, message_ts, attempt = await self.queue.get()
+            self.in_flight += 1
+            try:
+                await self._delete(channel_id, message_ts, attempt)
+            except Exception as e:
+                # Left in the journal so it is retried on the next start
+                self._queued.discard((channel_id, message_ts))
+                self.failed += 1
+                print(f"Failed to delete message: {e}")
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+
+    async def _delete(self, channel_id: str, message_ts: str, attempt: int):
+        limiter = self.limiters["chat.delete"]
+        await limiter.acquire()
         try:
-            client.chat_delete(channel=channel_id, ts=message_ts, as_user=True)
+            await self.client.chat_delete(channel=channel_id, ts=message_ts, as_user=True)
         except SlackApiError as e:
-            if e.response["error"] == "ratelimited":
+            error = e.response["error"]
+            if error == "ratelimited" and attempt < self.max_retries:
                 retry_after = int(e.response.headers.get("Retry-After", 1))
                 print(f"Rate limited, retrying in {retry_after} seconds.")
-                sleep(retry_after)
-                delete_queue.put((channel_id, message_ts))
-            else:
-                print(f"Failed to delete message: {e.response['error']}")
-        sleep(0.1)
-        delete_queue.task_done()
+                limiter.pause(retry_after)
+                self.retries += 1
+                self._enqueue(channel_id, message_ts, attempt + 1)
+                return
+            if error != "message_not_found":
+                self.failed += 1
+                print(f"Failed to delete message: {error}")
+                self._done(channel_id, message_ts)
+                return
+
+        self._done(channel_id, message_ts)
+        self.deleted += 1
+        self._drained.append(time.monotonic())
+
+
+delete_scheduler = DeleteScheduler(
+    MeteredWebClient(token=env.slack_user_token),
+    DeleteJournal(env.delete_queue_path),
+)
 
 
 def add_message_to_delete_queue(channel_id, message_ts):
-    delete_queue.put((channel_id, message_ts))
+    delete_scheduler.add(channel_id, message_ts)
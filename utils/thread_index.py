@@ -0,0 +1,65 @@
+from typing import Dict, List
+
+from pyairtable.api.types import RecordDict
+
+# Fields needed to relay between the public and private threads
+INDEX_FIELDS = ["identifier", "internal_thread", "status", "person"]
+
+
+class ThreadIndex:
+    """In-memory index of open help threads.
+
+    Maps the public thread ts, the private relay thread ts and the Airtable
+    record id to the same help record, so relaying does not need to query
+    Airtable.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, RecordDict] = {}
+        self._by_pub: Dict[str, str] = {}
+        self._by_priv: Dict[str, str] = {}
+        self.warmed = False
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, record: RecordDict):
+        if record["fields"].get("status") == "resolved":
+            self.remove(record["id"])
+            return
+
+        self.remove(record["id"])
+        self._by_id[record["id"]] = record
+        if pub := record["fields"].get("identifier"):
+            self._by_pub[pub] = record["id"]
+        if priv := record["fields"].get("internal_thread"):
+            self._by_priv[priv] = record["id"]
+
+    def add_many(self, records: List[RecordDict]):
+        for record in records:
+            self.add(record)
+
+    def remove(self, record_id: str) -> RecordDict | None:
+        record = self._by_id.pop(record_id, None)
+        if record is None:
+            return None
+        self._by_pub.pop(record["fields"].get("identifier"), None)
+        self._by_priv.pop(record["fields"].get("internal_thread"), None)
+        return record
+
+    def get(
+        self, pub_thread_ts: str | None = None, priv_thread_ts: str | None = None
+    ) -> RecordDict | None:
+        if pub_thread_ts:
+            record_id = self._by_pub.get(pub_thread_ts)
+        elif priv_thread_ts:
+            record_id = self._by_priv.get(priv_thread_ts)
+        else:
+            return None
+        return self._by_id.get(record_id) if record_id else None
+
+    def get_by_id(self, record_id: str) -> RecordDict | None:
+        return self._by_id.get(record_id)
+
+    def records(self) -> List[RecordDict]:
+        return list(self._by_id.values())
@@ -0,0 +1,23 @@
+from typing import Any, Dict
+
+from slack_sdk.web.async_client import AsyncWebClient
+
+from .cache import TTLCache
+
+# Profiles are refreshed by `user_change` events, the TTL is only a backstop
+user_cache: TTLCache[str, Dict[str, Any]] = TTLCache(maxsize=4096, ttl=60 * 60)
+
+
+async def get_user(client: AsyncWebClient, user_id: str) -> Dict[str, Any]:
+    """Returns the Slack user object for `user_id`, calling `users.info` on a cache miss"""
+    user = user_cache.get(user_id)
+    if user is None:
+        res = await client.users_info(user=user_id)
+        user = res["user"]
+        user_cache.set(user_id, user)
+    return user
+
+
+def update_user(user: Dict[str, Any]):
+    """Replaces the cached profile with the one sent in a `user_change` event"""
+    user_cache.set(user["id"], user)
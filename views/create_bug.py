@@ -23,92 +23,106 @@ LABELS = [
     'writing'
 ]
 
-def get_modal(thread_id):
-    return {
-        "type": "modal",
-        "callback_id": "create_issue",
-        "title": {
+# Built once at import, only the thread ts in the last block changes per modal
+TITLE = {
+    "type": "plain_text",
+    "text": "Create Issue",
+    "emoji": True
+}
+SUBMIT = {
+    "type": "plain_text",
+    "text": "Submit",
+    "emoji": True
+}
+CLOSE = {
+    "type": "plain_text",
+    "text": "Cancel",
+    "emoji": True
+}
+
+LABEL_OPTIONS = [
+    {
+        "text": {
             "type": "plain_text",
-            "text": "Create Issue",
+            "text": label.capitalize(),
             "emoji": True
         },
-        "submit": {
+        "value": label
+    }
+    for label in LABELS
+]
+
+INPUT_BLOCKS = [
+    {
+        "type": "input",
+        "block_id": "title",
+        "element": {
+            "type": "plain_text_input",
+            "action_id": "title"
+        },
+        "label": {
             "type": "plain_text",
-            "text": "Submit",
+            "text": "Title",
             "emoji": True
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "body",
+        "element": {
+            "type": "plain_text_input",
+            "multiline": True,
+            "action_id": "body"
         },
-        "close": {
+        "label": {
             "type": "plain_text",
-            "text": "Cancel",
+            "text": "Description",
             "emoji": True
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "labels",
+        "element": {
+            "type": "multi_static_select",
+            "placeholder": {
+                "type": "plain_text",
+                "text": "Select Labels",
+                "emoji": True
+            },
+            "options": LABEL_OPTIONS,
+            "action_id": "labels"
         },
+        "label": {
+            "type": "plain_text",
+            "text": "Labels",
+            "emoji": True
+        }
+    },
+]
+
+FOOTER_ELEMENTS = [
+    {
+        "type": "plain_text",
+        "text": f"This will be created as an issue on {env.github_repo}. Please make sure it is not a duplicate issue. If it's a duplicate, please cancel and mark as resolved.",
+        "emoji": True
+    }
+]
+
+
+def get_modal(thread_id):
+    return {
+        "type": "modal",
+        "callback_id": "create_issue",
+        "title": TITLE,
+        "submit": SUBMIT,
+        "close": CLOSE,
         "blocks": [
-            {
-                "type": "input",
-                "block_id": "title",
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "title"
-                },
-                "label": {
-                    "type": "plain_text",
-                    "text": "Title",
-                    "emoji": True
-                }
-            },
-            {
-                "type": "input",
-                "block_id": "body",
-                "element": {
-                    "type": "plain_text_input",
-                    "multiline": True,
-                    "action_id": "body"
-                },
-                "label": {
-                    "type": "plain_text",
-                    "text": "Description",
-                    "emoji": True
-                }
-            },
-            {
-			"type": "input",
-			"block_id": "labels",
-			"element": {
-				"type": "multi_static_select",
-				"placeholder": {
-					"type": "plain_text",
-					"text": "Select Labels",
-					"emoji": True
-				},
-				"options": [
-					{
-						"text": {
-							"type": "plain_text",
-							"text": label.capitalize(),
-							"emoji": True
-						},
-						"value": label
-					}
-					for label in LABELS
-				],
-				"action_id": "labels"
-			},
-			"label": {
-				"type": "plain_text",
-				"text": "Labels",
-				"emoji": True
-			}
-		},
+            *INPUT_BLOCKS,
             {
                 "type": "context",
                 "block_id": thread_id,
-                "elements": [
-                    {
-                        "type": "plain_text",
-                        "text": f"This will be created as an issue on {env.github_repo}. Please make sure it is not a duplicate issue. If it's a duplicate, please cancel and mark as resolved.",
-                        "emoji": True
-                    }
-                ]
+                "elements": FOOTER_ELEMENTS
             }
         ]
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,44 @@
+from typing import Any, Dict, List
+
+# The buttons are the same on every ticket card, so they are built once
+ACTIONS_BLOCK = {
+    "type": "actions",
+    "elements": [
+        {
+            "type": "button",
+            "text": {"type": "plain_text", "text": "Use Macro"},
+            "value": "use-macro",
+            "action_id": "use-macro",
+        },
+        {
+            "type": "button",
+            "text": {"type": "plain_text", "text": "Open Ticket"},
+            "value": "mark-bug",
+            "action_id": "mark-bug",
+        },
+        {
+            "type": "button",
+            "text": {"type": "plain_text", "text": "Mark Resolved"},
+            "style": "primary",
+            "value": "mark-resolved",
+            "action_id": "mark-resolved",
+        },
+    ],
+}
+
+
+def get_blocks(user_id: str, count: int | None, thread_url: str) -> List[Dict[str, Any]]:
+    """`count` is None when the user's other help requests couldn't be looked up"""
+    history = f" They have {count} other help requests." if count is not None else ""
+    return [
+        {
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"Submitted by <@{user_id}>.{history} <{thread_url}|Go to thread>",
+                }
+            ],
+        },
+        ACTIONS_BLOCK,
+    ]
@@ -1,153 +1,224 @@
-import itertools
-from typing import Any, Dict
+import dataclasses
+from typing import Any, Dict, List, Tuple
+from utils.airtable import Macro
+from utils.cache import TTLCache
 from utils.env import env
 
 PAGE_SIZE = 15
 
+# Everything below is static, so it is built once and shared between renders.
+# Slack only serializes views, it never mutates them.
+TITLE = {"type": "plain_text", "text": "Execute a macro", "emoji": True}
+CLOSE = {"type": "plain_text", "text": "Cancel", "emoji": True}
+DIVIDER = {"type": "divider"}
 
-def get_modal(ts: str, user_id: str, page: int = 0) -> Dict[str, Any]:
-    macros = env.airtable.get_macros(user_id)
-    current_page = macros[page*PAGE_SIZE:(page+1)*PAGE_SIZE]
-    is_end_page = len(macros) < (page+1)*PAGE_SIZE
-    is_first_page = page == 0
+SEARCH_BLOCK = {
+    "type": "section",
+    "text": {"type": "mrkdwn", "text": "*Search team macros*"},
+    "accessory": {
+        "type": "external_select",
+        "placeholder": {
+            "type": "plain_text",
+            "text": "Search by name or message",
+            "emoji": True,
+        },
+        "min_query_length": 2,
+        "action_id": "search-macro",
+        # Picking a result posts it straight into the asker's thread
+        "confirm": {
+            "title": {"type": "plain_text", "text": "Send this macro?"},
+            "text": {
+                "type": "mrkdwn",
+                "text": "The selected macro will be posted in the thread. If it is set to close, the thread is resolved too.",
+            },
+            "confirm": {"type": "plain_text", "text": "Send"},
+            "deny": {"type": "plain_text", "text": "Cancel"},
+        },
+    },
+}
+HEADER_BLOCK = {"type": "header", "text": {"type": "plain_text", "text": "Your macros"}}
 
-    return {
-        "type": "modal",
-        "title": {"type": "plain_text", "text": "Execute a macro", "emoji": True},
-        "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
-        "blocks": [
-            {"type": "header", "text": {"type": "plain_text", "text": "Your macros"}},
+PREVIOUS_PAGE_TEXT = {"type": "plain_text", "text": ":arrow_left: Previous page", "emoji": True}
+NEXT_PAGE_TEXT = {"type": "plain_text", "text": "Next page :arrow_right:", "emoji": True}
+NO_PREVIOUS_PAGE = {
+    "type": "button",
+    "text": {"type": "plain_text", "text": ":see_no_evil: (no previous page)", "emoji": True},
+}
+NO_NEXT_PAGE = {
+    "type": "button",
+    "text": {"type": "plain_text", "text": "(no next page) :see_no_evil:", "emoji": True},
+}
+
+CREATE_MACRO_BLOCK = {
+    "type": "actions",
+    "elements": [
+        {
+            "type": "button",
+            "text": {
+                "type": "plain_text",
+                "text": "Create a new macro",
+                "emoji": True,
+            },
+            "value": "love you slack",
+            "style": "primary",
+            "action_id": "create-macro",
+        }
+    ],
+}
+
+
+@dataclasses.dataclass
+class MacroTemplate:
+    """The parts of a macro's blocks that don't depend on the thread ts"""
+
+    id: str
+    blocks: List[Dict[str, Any]]
+    execute_button: Dict[str, Any]
+    delete_button: Dict[str, Any]
+
+
+@dataclasses.dataclass
+class PageTemplate:
+    context: Dict[str, Any]
+    is_first_page: bool
+    is_end_page: bool
+    macros: List[MacroTemplate]
+
+
+# Macros are never edited in place, so the ids on a page identify its content
+page_cache: TTLCache[Tuple[str, int, int, Tuple[str, ...]], PageTemplate] = TTLCache(maxsize=1024, ttl=60 * 60)
+
+
+def macro_template(macro: Macro) -> MacroTemplate:
+    return MacroTemplate(
+        id=macro.id,
+        blocks=[
+            {
+                "type": "section",
+                "text": {"type": "mrkdwn", "text": f"*{macro.name}*"},
+            },
+            macro.message,
             {
                 "type": "context",
                 "elements": [
                     {
                         "type": "mrkdwn",
-                        "text": f"Showing {(page*PAGE_SIZE)+1}-{(page*PAGE_SIZE)+len(current_page)} of {len(macros)}"
+                        "text": ":no_entry: Closes thread"
+                        if macro.close
+                        else ":white_check_mark: Leaves thread open",
                     }
                 ],
             },
-            *([{
-                "type": "actions",
-                "elements": [
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": ":arrow_left: Previous page",
-                            "emoji": True,
-                        },
-                        "value": f"{page-1};{ts}",
-                        "action_id": "use-macro-pagination",
-                    } if not is_first_page else {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": ":see_no_evil: (no previous page)",
-                            "emoji": True,
-                        },
-                    },
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Next page :arrow_right:",
-                            "emoji": True,
-                        },
-                        "value": f"{page+1};{ts}",
-                        "action_id": "use-macro-pagination",
-                    } if not is_end_page else {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "(no next page) :see_no_evil:",
-                            "emoji": True,
-                        },
-                    },
-                ],
-            }] if not (is_end_page and is_first_page) else []),
-            *itertools.chain.from_iterable(
-                [
-                    [
-                        {
-                            "type": "section",
-                            "text": {"type": "mrkdwn", "text": f"*{macro.name}*"},
-                        },
-                        macro.message,
-                        {
-                            "type": "context",
-                            "elements": [
-                                {
-                                    "type": "mrkdwn",
-                                    "text": ":no_entry: Closes thread"
-                                    if macro.close
-                                    else ":white_check_mark: Leaves thread open",
-                                }
-                            ],
-                        },
-                        {
-                            "type": "actions",
-                            "elements": [
-                                {
-                                    "type": "button",
-                                    "text": {
-                                        "type": "plain_text",
-                                        "text": f"Execute{" and close" if macro.close else ""}",
-                                        "emoji": True,
-                                    },
-                                    "value": f"{i};{ts}",
-                                    "action_id": "execute-macro",
-                                },
-                                {
-                                    "type": "button",
-                                    "text": {
-                                        "type": "plain_text",
-                                        "text": "Delete macro",
-                                        "emoji": True,
-                                    },
-                                    "style": "danger",
-                                    "value": f"{i};{ts}",
-                                    "action_id": "delete-macro",
-                                    "confirm": {
-                                        "title": {
-                                            "type": "plain_text",
-                                            "text": "Confirm",
-                                        },
-                                        "text": {
-                                            "type": "plain_text",
-                                            "text": f"Do you want to delete {macro.name}?",
-                                        },
-                                        "confirm": {
-                                            "type": "plain_text",
-                                            "text": "Go on",
-                                        },
-                                        "deny": {
-                                            "type": "plain_text",
-                                            "text": "Nevermind actually",
-                                        },
-                                    },
-                                },
-                            ],
-                        },
-                        {"type": "divider"},
-                    ]
-                    for i, macro in enumerate(current_page)
-                ]
-            ),
-            {
-                "type": "actions",
+        ],
+        execute_button={
+            "type": "button",
+            "text": {
+                "type": "plain_text",
+                "text": f"Execute{" and close" if macro.close else ""}",
+                "emoji": True,
+            },
+            "action_id": "execute-macro",
+        },
+        delete_button={
+            "type": "button",
+            "text": {
+                "type": "plain_text",
+                "text": "Delete macro",
+                "emoji": True,
+            },
+            "style": "danger",
+            "action_id": "delete-macro",
+            "confirm": {
+                "title": {
+                    "type": "plain_text",
+                    "text": "Confirm",
+                },
+                "text": {
+                    "type": "plain_text",
+                    "text": f"Do you want to delete {macro.name}?",
+                },
+                "confirm": {
+                    "type": "plain_text",
+                    "text": "Go on",
+                },
+                "deny": {
+                    "type": "plain_text",
+                    "text": "Nevermind actually",
+                },
+            },
+        },
+    )
+
+
+def page_template(user_id: str, macros: List[Macro], page: int) -> PageTemplate:
+    current_page = macros[page*PAGE_SIZE:(page+1)*PAGE_SIZE]
+    key = (user_id, page, len(macros), tuple(macro.id for macro in current_page))
+    template = page_cache.get(key)
+    if template is None:
+        template = PageTemplate(
+            context={
+                "type": "context",
                 "elements": [
                     {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Create a new macro",
-                            "emoji": True,
-                        },
-                        "value": "love you slack",
-                        "style": "primary",
-                        "action_id": "create-macro",
+                        "type": "mrkdwn",
+                        "text": f"Showing {(page*PAGE_SIZE)+1}-{(page*PAGE_SIZE)+len(current_page)} of {len(macros)}"
                     }
                 ],
             },
-        ],
+            is_first_page=page == 0,
+            is_end_page=len(macros) < (page+1)*PAGE_SIZE,
+            macros=[macro_template(macro) for macro in current_page],
+        )
+        page_cache.set(key, template)
+    return template
+
+
+def render_modal(ts: str, user_id: str, macros: List[Macro], page: int = 0) -> Dict[str, Any]:
+    template = page_template(user_id, macros, page)
+
+    blocks = [SEARCH_BLOCK, DIVIDER, HEADER_BLOCK, template.context]
+    if not (template.is_end_page and template.is_first_page):
+        blocks.append({
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": PREVIOUS_PAGE_TEXT,
+                    "value": f"{page-1};{ts}",
+                    "action_id": "use-macro-pagination",
+                } if not template.is_first_page else NO_PREVIOUS_PAGE,
+                {
+                    "type": "button",
+                    "text": NEXT_PAGE_TEXT,
+                    "value": f"{page+1};{ts}",
+                    "action_id": "use-macro-pagination",
+                } if not template.is_end_page else NO_NEXT_PAGE,
+            ],
+        })
+
+    for macro in template.macros:
+        value = f"{macro.id};{ts}"
+        blocks.extend(macro.blocks)
+        blocks.append({
+            "type": "actions",
+            "elements": [
+                {**macro.execute_button, "value": value},
+                {**macro.delete_button, "value": value},
+            ],
+        })
+        blocks.append(DIVIDER)
+
+    blocks.append(CREATE_MACRO_BLOCK)
+
+    return {
+        "type": "modal",
+        "title": TITLE,
+        "close": CLOSE,
+        "private_metadata": ts,
+        "blocks": blocks,
     }
+
+
+async def get_modal(ts: str, user_id: str, page: int = 0) -> Dict[str, Any]:
+    macros = await env.airtable.get_macros(user_id)
+    return render_modal(ts, user_id, macros, page)